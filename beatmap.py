@@ -0,0 +1,255 @@
+"""
+Generador automatico de partituras de NEURO RHYTHM a partir de un audio.
+
+Detecta los pulsos del tema (flujo espectral + tempo por autocorrelacion +
+seguimiento de pulsos por programacion dinamica, solo NumPy/SciPy) y escribe
+una partitura en el formato de load_chart. El resultado se guarda en cache
+con el hash del audio: el analisis corre una sola vez por tema.
+
+Uso:
+    python beatmap.py music/background.mp3
+    python beatmap.py tema.wav --output music/background.chart.json --force
+"""
+import os
+import argparse
+import hashlib
+import json
+import sys
+import time
+
+import numpy as np
+from scipy import signal
+
+ANALYSIS_VERSION = 2        # Cambiarlo invalida las partituras en cache
+ANALYSIS_RATE = 22050       # Hz a los que se remuestrea el audio
+FFT_SIZE = 1024
+HOP_SIZE = 256
+BPM_RANGE = (70, 180)
+BPM_PRIOR = 120             # Tempo preferido cuando hay ambiguedad (doble / mitad)
+BEAT_TIGHTNESS = 100        # Penalizacion a pulsos que se alejan del periodo
+FIRST_NOTE_TIME = 3.0       # Segundos sin notas al inicio (tiempo para ubicarse)
+
+#AUDIO
+def file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_audio(path):
+    """Devuelve (muestras mono float32, frecuencia de muestreo)"""
+    if path.lower().endswith(".wav"):
+        from scipy.io import wavfile
+        rate, samples = wavfile.read(path)
+    else:
+        # mp3 / ogg: se decodifican con el mixer de pygame
+        os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+        import pygame
+        if not pygame.mixer.get_init():
+            pygame.mixer.init()
+        rate = pygame.mixer.get_init()[0]
+        samples = pygame.sndarray.array(pygame.mixer.Sound(path))
+
+    samples = samples.astype(np.float32)
+    if samples.ndim > 1:
+        samples = samples.mean(axis=1)
+    peak = np.abs(samples).max()
+    if peak > 0:
+        samples /= peak
+    return samples, rate
+
+#ANALISIS
+def onset_envelope(samples, rate, chunk_frames=2048):
+    """Flujo espectral (log-magnitud, solo aumentos) normalizado; devuelve (envolvente, frames por segundo)"""
+    if rate != ANALYSIS_RATE:
+        g = np.gcd(int(rate), ANALYSIS_RATE)
+        samples = signal.resample_poly(samples, ANALYSIS_RATE // g, int(rate) // g).astype(np.float32)
+    if len(samples) < FFT_SIZE:
+        return np.zeros(0, dtype=np.float32), ANALYSIS_RATE / HOP_SIZE
+
+    frames = np.lib.stride_tricks.sliding_window_view(samples, FFT_SIZE)[::HOP_SIZE]
+    window = signal.get_window("hann", FFT_SIZE).astype(np.float32)
+    # Por bloques: el espectrograma completo de un tema ocuparia cientos de MB.
+    # Solo se guarda el flujo; la ultima fila de cada bloque se compara con la primera del siguiente
+    flux = np.zeros(len(frames), dtype=np.float32)
+    previous = None
+    for start in range(0, len(frames), chunk_frames):
+        block = frames[start:start + chunk_frames] * window
+        magnitude = np.log1p(100 * np.abs(np.fft.rfft(block, axis=1))).astype(np.float32)
+        if previous is not None:
+            flux[start] = np.maximum(magnitude[0] - previous, 0).sum()
+        flux[start + 1:start + len(magnitude)] = np.maximum(np.diff(magnitude, axis=0), 0).sum(axis=1)
+        previous = magnitude[-1]
+
+    # Quitar la tendencia lenta y normalizar
+    frame_rate = ANALYSIS_RATE / HOP_SIZE
+    trend = np.convolve(flux, np.ones(int(frame_rate)) / int(frame_rate), mode="same")
+    envelope = np.maximum(flux - trend, 0)
+    std = envelope.std()
+    return (envelope / std if std > 0 else envelope), frame_rate
+
+def estimate_tempo(envelope, frame_rate):
+    """Periodo del pulso en frames: maximo de la autocorrelacion ponderada alrededor de BPM_PRIOR"""
+    centered = envelope - envelope.mean()
+    autocorr = signal.fftconvolve(centered, centered[::-1], mode="full")[len(centered) - 1:]
+    min_lag = int(frame_rate * 60 / BPM_RANGE[1])
+    max_lag = min(int(frame_rate * 60 / BPM_RANGE[0]), len(autocorr) - 1)
+    if max_lag <= min_lag:
+        return int(frame_rate * 60 / BPM_PRIOR)
+    lags = np.arange(min_lag, max_lag + 1)
+    bpms = frame_rate * 60 / lags
+    prior = np.exp(-0.5 * np.log2(bpms / BPM_PRIOR) ** 2)
+    return int(lags[np.argmax(autocorr[lags] * prior)])
+
+def track_beats(envelope, period, tightness=BEAT_TIGHTNESS):
+    """
+    Seguimiento de pulsos por programacion dinamica: maximiza la energia de
+    onset en los pulsos penalizando intervalos distintos del periodo.
+    Devuelve los indices de frame de los pulsos.
+    """
+    n = len(envelope)
+    if n == 0 or period <= 0:
+        return np.zeros(0, dtype=int)
+    offsets = np.arange(-2 * period, -(period // 2) + 1)
+    penalty = -tightness * np.log(-offsets / period) ** 2
+
+    score = envelope.astype(np.float64).copy()
+    backlink = np.full(n, -1)
+    for t in range(n):
+        prev = t + offsets
+        valid = prev >= 0
+        if not valid.any():
+            continue
+        candidates = score[prev[valid]] + penalty[valid]
+        best = np.argmax(candidates)
+        score[t] = envelope[t] + candidates[best]
+        backlink[t] = prev[valid][best]
+
+    # Ultimo pulso: el de mayor puntaje en el ultimo periodo, y se recorre hacia atras
+    beat = n - period + int(np.argmax(score[-period:])) if n > period else int(np.argmax(score))
+    beats = []
+    while beat >= 0:
+        beats.append(beat)
+        beat = backlink[beat]
+    return np.array(beats[::-1], dtype=int)
+
+def detect_beats(samples, rate):
+    """Devuelve (tiempos de pulso en segundos, fuerza de cada pulso, BPM estimado)"""
+    envelope, frame_rate = onset_envelope(samples, rate)
+    if not envelope.any():
+        # Sin onsets (tema vacio o en silencio): la programacion dinamica inventaria pulsos
+        return np.zeros(0), np.zeros(0), 0.0
+    period = estimate_tempo(envelope, frame_rate)
+    beats = track_beats(envelope, period)
+    # Cada frame se ubica en el centro de su ventana de FFT
+    times = beats / frame_rate + FFT_SIZE / 2 / ANALYSIS_RATE
+    return times, envelope[beats], frame_rate * 60 / period
+
+#PARTITURA
+def generate_chart(beat_times, strengths, pose_keys, lanes, seed, min_gap, first_note=FIRST_NOTE_TIME):
+    """
+    Una nota por pulso con pose y carril pseudoaleatorios y reproducibles.
+    `min_gap` (ancho del objetivo / su velocidad) separa las notas de un mismo
+    carril para que sus objetivos no se solapen; el pulso va a otro carril
+    libre y solo se omite si no queda ninguno. Se tolera un hop de analisis:
+    el periodo cuantizado no debe dejar afuera un pulso de cada dos.
+    """
+    rng = np.random.default_rng(seed)
+    notes = []
+    min_gap -= HOP_SIZE / ANALYSIS_RATE
+    lane_last = np.full(lanes, -np.inf)
+    for beat_time, strength in zip(beat_times, strengths):
+        if beat_time < first_note:
+            continue
+        free = np.flatnonzero(beat_time - lane_last >= min_gap)
+        if len(free) == 0:
+            continue
+        lane = int(free[rng.integers(len(free))])
+        lane_last[lane] = beat_time
+        notes.append({
+            "time": round(float(beat_time), 4),
+            "pose": pose_keys[int(rng.integers(len(pose_keys)))],
+            "lane": lane,
+            "strength": round(float(strength), 2)
+        })
+    return notes
+
+def cache_key(audio_hash, pose_keys, lanes, min_gap):
+    """El cache depende del audio, de la version del analisis y de los parametros de la partitura"""
+    params = f"{ANALYSIS_VERSION}|{','.join(pose_keys)}|{lanes}|{min_gap:.4f}"
+    return hashlib.sha1(f"{audio_hash}|{params}".encode()).hexdigest()[:16]
+
+def generated_chart_key(path):
+    """cache_key de una partitura escrita por ensure_chart (None si es propia o ilegible)"""
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return data.get("cache_key") if isinstance(data, dict) else None
+
+def ensure_chart(audio_path, pose_keys, lanes, min_gap, cache_dir="charts", output=None, force=False):
+    """
+    Devuelve la ruta de la partitura generada para `audio_path`; solo analiza
+    el audio si no esta en cache (o con force=True). Nunca sobrescribe una
+    partitura que no haya escrito el generador (FileExistsError). Devuelve
+    None si el tema no tiene pulsos (no se escribe una partitura vacia).
+    """
+    audio_hash = file_hash(audio_path)
+    key = cache_key(audio_hash, pose_keys, lanes, min_gap)
+    path = output or os.path.join(cache_dir, f"{key}.chart.json")
+    if os.path.exists(path):
+        existing_key = generated_chart_key(path)
+        if existing_key is None:
+            raise FileExistsError(f"{path} no es una partitura generada (sin cache_key): no se sobrescribe")
+        if existing_key == key and not force:
+            return path
+
+    print(f"Analizando pulsos de {audio_path} (solo la primera vez)...")
+    start = time.perf_counter()
+    samples, rate = load_audio(audio_path)
+    beat_times, strengths, bpm = detect_beats(samples, rate)
+    notes = generate_chart(beat_times, strengths, pose_keys, lanes, seed=int(audio_hash[:8], 16),
+                           min_gap=min_gap)
+    if not notes:
+        print(f"No se detectaron pulsos en {audio_path}: no se genera partitura")
+        return None
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({
+            "source": os.path.basename(audio_path),
+            "cache_key": key,
+            "bpm": round(float(bpm), 1),
+            "offset": 0.0,
+            "notes": notes
+        }, f, indent=1)
+    elapsed = time.perf_counter() - start
+    print(f"Partitura generada: {path} ({len(notes)} notas, {bpm:.0f} BPM, {elapsed:.1f} s)")
+    return path
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Genera una partitura a partir de un audio")
+    parser.add_argument("audio", help="Archivo de audio (wav, mp3, ogg)")
+    parser.add_argument("--output", help="Ruta de la partitura (por defecto en el cache)")
+    parser.add_argument("--force", action="store_true", help="Analizar aunque este en cache")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.audio):
+        print(f"No se encontro el audio: {args.audio}")
+        sys.exit(1)
+
+    from main import get_pose_registry, CHART_LANES, CHART_MIN_NOTE_GAP, CHART_CACHE_DIR
+    try:
+        path = ensure_chart(args.audio, get_pose_registry().keys, CHART_LANES, CHART_MIN_NOTE_GAP,
+                            cache_dir=CHART_CACHE_DIR, output=args.output, force=args.force)
+    except FileExistsError as e:
+        print(e)
+        print("Indica otra ruta con --output")
+        sys.exit(1)
+    if path is None:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main_cli()
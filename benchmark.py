@@ -0,0 +1,231 @@
+"""
+Benchmark sin ventana ni camara de NEURO RHYTHM.
+
+Reproduce un video grabado (o frames sinteticos) a traves del mismo frame
+del juego: captura de CameraEngine y LevelBody.update (compuerta de
+movimiento, ROI, inferencia YOLO, poses, juicios y dibujo), con el
+gobernador de calidad. Los tiempos por etapa son las marcas de FrameProfiler.
+Usa el driver de video "dummy" de SDL.
+
+Uso:
+    python benchmark.py --video sesion.mp4
+    python benchmark.py --synthetic --frames 300 --backend onnx
+"""
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import argparse
+import json
+import resource
+import sys
+import time
+
+import cv2
+import numpy as np
+import pygame
+
+import main
+from main import (
+    CameraEngine, FrameProfiler, LevelBody, PoseBackend, QualityGovernor,
+    PROFILER_STAGES, WINDOW_WIDTH, WINDOW_HEIGHT, TARGET_FPS
+)
+
+#FUENTES DE FRAMES
+class VideoFileSource:
+    """Lee un video y entrega frames BGR del tamano de la ventana (interfaz de cv2.VideoCapture)"""
+    def __init__(self, path, loop=True):
+        self.cap = cv2.VideoCapture(path)
+        self.loop = loop
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or TARGET_FPS
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def read(self, image=None):
+        ret, frame = self.cap.read()
+        if not ret and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.cap.read()
+        if not ret:
+            return False, None
+        if frame.shape[1] != WINDOW_WIDTH or frame.shape[0] != WINDOW_HEIGHT:
+            frame = cv2.resize(frame, (WINDOW_WIDTH, WINDOW_HEIGHT), dst=image)
+        return True, frame
+
+    def release(self):
+        self.cap.release()
+
+class SyntheticSource:
+    """Frames sinteticos con un bloque en movimiento (sin dependencia de archivos)"""
+    def __init__(self):
+        self.fps = TARGET_FPS
+        self.index = 0
+        self.frame = np.zeros((WINDOW_HEIGHT, WINDOW_WIDTH, 3), dtype=np.uint8)
+
+    def isOpened(self):
+        return True
+
+    def read(self, image=None):
+        frame = self.frame if image is None else image
+        frame[:] = 40
+        x = (self.index * 8) % (WINDOW_WIDTH - 200)
+        frame[200:520, x:x + 200] = (200, 180, 160)
+        self.index += 1
+        return True, frame
+
+    def release(self):
+        pass
+
+#BENCHMARK
+class HeadlessLevel(LevelBody):
+    """LevelBody del juego sin el dibujo de la UI (--no-draw)"""
+    def draw_ui(self, active_poses):
+        pass
+
+def percentiles_ms(samples):
+    values = np.fromiter(samples, dtype=np.float64)
+    return {
+        "mean": float(values.mean()),
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "p99": float(np.percentile(values, 99)),
+        "max": float(values.max())
+    }
+
+def run_benchmark(source, model, frames, inference_size=None, draw=True, roi=True, motion_gate=True):
+    """
+    Ejecuta `frames` iteraciones del frame del juego (LevelBody.update, con su
+    compuerta de movimiento, ROI, juicios y el gobernador de calidad) y
+    devuelve las estadisticas de las marcas de FrameProfiler. Con
+    `inference_size` la calidad queda fija en ese tamano, sin gobernador.
+    """
+    screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
+    cam = CameraEngine(threaded=False, capture=source)
+    profiler = FrameProfiler(window=frames, trace_path=None)
+
+    # Reloj virtual segun los FPS de la fuente: la simulacion es determinista
+    frame_dt = 1.0 / source.fps
+    virtual_now = [0.0]
+    level_class = LevelBody if draw else HeadlessLevel
+    level = level_class(screen, model, clock=lambda: virtual_now[0], profiler=profiler)
+    if not roi:
+        level.roi = None
+    if not motion_gate:
+        level.motion_gate = None
+
+    # Mismo criterio que GameManager.begin_level / apply_quality
+    governor = QualityGovernor() if main.QUALITY_GOVERNOR and inference_size is None else None
+    if governor:
+        level.set_quality(governor.settings)
+    elif inference_size is not None:
+        level.inference_size = inference_size or None
+    quality_changes = 0
+
+    start_all = time.perf_counter()
+    for i in range(frames):
+        virtual_now[0] = i * frame_dt
+        frame_start = time.perf_counter()
+        profiler.begin_frame()
+
+        frame_surf = cam.get_frame()
+        if frame_surf is None:
+            print("Fin de la fuente de video")
+            break
+        screen.blit(frame_surf, (0, 0))
+        profiler.lap("captura")
+
+        level.update(cam.last_frame_rgb, virtual_now[0])
+        if draw:
+            pygame.display.flip()
+            profiler.lap("presentacion")
+
+        if governor and governor.update(time.perf_counter() - frame_start):
+            level.set_quality(governor.settings)
+            quality_changes += 1
+        profiler.end_frame()
+
+    total = time.perf_counter() - start_all
+    cam.release()
+    level.flush_judgements()
+
+    if not profiler.frame_samples:
+        return None
+
+    # ru_maxrss esta en KB en Linux
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    frame_count = len(profiler.frame_samples)
+    return {
+        "frames": frame_count,
+        "fps": frame_count / total,
+        "frame_ms": percentiles_ms(profiler.frame_samples),
+        "stages_ms": {stage: percentiles_ms(profiler.samples[stage])
+                      for stage in PROFILER_STAGES if profiler.samples.get(stage)},
+        "inferences": len(profiler.events.get("inferencia", ())),
+        "quality_level": governor.index if governor else None,
+        "quality_changes": quality_changes,
+        "peak_memory_mb": peak_mb,
+        "score": level.score,
+        "hits": level.hits,
+        "misses": level.misses,
+        "roi_pixel_ratio": level.roi.pixel_ratio() if level.roi else 1.0
+    }
+
+def print_report(stats):
+    print("\n" + "="*70)
+    print(f"Frames: {stats['frames']}   FPS: {stats['fps']:.1f}   "
+          f"Memoria pico: {stats['peak_memory_mb']:.0f} MB   "
+          f"Pixeles inferidos: {stats['roi_pixel_ratio'] * 100:.0f}%")
+    quality = "fija" if stats["quality_level"] is None else \
+        f"nivel {stats['quality_level']} ({stats['quality_changes']} cambios)"
+    print(f"Inferencias: {stats['inferences']}   Calidad: {quality}")
+    print("="*70)
+    print(f"{'Etapa':<14}{'media':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  (ms)")
+    rows = list(stats["stages_ms"].items()) + [("frame", stats["frame_ms"])]
+    for stage, p in rows:
+        print(f"{stage:<14}{p['mean']:>9.2f}{p['p50']:>9.2f}{p['p95']:>9.2f}{p['p99']:>9.2f}{p['max']:>9.2f}")
+    print("="*70)
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Benchmark headless de NEURO RHYTHM")
+    parser.add_argument("--video", help="Video grabado a reproducir")
+    parser.add_argument("--synthetic", action="store_true", help="Usar frames sinteticos")
+    parser.add_argument("--frames", type=int, default=300, help="Frames a procesar")
+    parser.add_argument("--backend", default=main.INFERENCE_BACKEND, help="torch, onnx u openvino")
+    parser.add_argument("--inference-size", type=int, default=None,
+                        help="Fijar el lado mayor de la entrada a YOLO, sin gobernador (0 = resolucion completa)")
+    parser.add_argument("--no-draw", action="store_true", help="No medir el dibujo de la UI")
+    parser.add_argument("--no-roi", action="store_true", help="Inferir siempre sobre el frame completo")
+    parser.add_argument("--no-motion-gate", action="store_true", help="Inferir aunque la escena este quieta")
+    parser.add_argument("--json", help="Guardar resultados en un archivo JSON")
+    args = parser.parse_args()
+
+    if not args.video and not args.synthetic:
+        parser.error("Indica --video o --synthetic")
+
+    source = SyntheticSource() if args.synthetic else VideoFileSource(args.video)
+    if not source.isOpened():
+        print(f"No se pudo abrir el video: {args.video}")
+        sys.exit(1)
+
+    pygame.init()
+    model = PoseBackend(args.backend)
+    if args.inference_size is None:
+        model.warmup(inference_size=main.QUALITY_LEVELS[0]["inference_size"])
+    else:
+        model.warmup(inference_size=args.inference_size or None)
+
+    stats = run_benchmark(source, model, args.frames, args.inference_size, draw=not args.no_draw,
+                          roi=not args.no_roi, motion_gate=not args.no_motion_gate)
+    pygame.quit()
+    if stats is None:
+        print("No se proceso ningun frame")
+        sys.exit(1)
+
+    print_report(stats)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(stats, f, indent=2)
+        print(f"Resultados guardados en {args.json}")
+
+if __name__ == "__main__":
+    main_cli()
@@ -1,25 +1,158 @@
+import time
+STARTUP_TIME = time.perf_counter()  # Referencia del reporte de arranque
+
 import cv2
 import pygame
 import numpy as np
-from ultralytics import YOLO
 import sys
 import random
 import math
 import os
+import threading
+import json
+import re
+from collections import deque, OrderedDict
+# ultralytics (y torch) se importan al cargar el modelo, en segundo plano
+
+IMPORT_TIME = time.perf_counter() - STARTUP_TIME
 
 #CONFIGURACION GENERAL
 WINDOW_WIDTH = 1280
 WINDOW_HEIGHT = 720
 CAMERA_ID = 0 
+THREADED_CAPTURE = True    # Hilo dedicado para leer la camara
+CAPTURE_BUFFER_SIZE = 3    # Frames guardados en el buffer circular
+ZERO_COPY_DISPLAY = True   # Reutilizar buffers y superficie de la camara
 
 # RUTA DE MUSICA 
 MUSIC_PATH = "music/background.mp3" 
-SPAWN_INTERVAL = 45  # Frames entre objetivos
-TARGET_SPEED = 9
+SPAWN_INTERVAL = 1.5  # Segundos entre objetivos
+TARGET_SPEED = 270    # Pixeles por segundo
 ACTIVATION_ZONE_X = 350
 PERFECT_ZONE_X = 250
 TARGET_WIDTH = 140
 TARGET_HEIGHT = 90
+FEEDBACK_LIFETIME = 1.0     # Segundos que dura un mensaje de feedback
+FEEDBACK_RISE_SPEED = 60    # Pixeles por segundo que sube el feedback
+TARGET_POOL_SIZE = 64       # Capacidad inicial de objetivos simultaneos (crece si hace falta)
+FEEDBACK_POOL_SIZE = 64     # Capacidad inicial de mensajes de feedback
+
+# Partitura sincronizada con la musica (si no existe: objetivos aleatorios)
+CHART_PATH = "music/background.chart.json"
+CHART_LANES = 4                 # Alturas posibles de las notas
+CHART_MIN_NOTE_GAP = TARGET_WIDTH / TARGET_SPEED   # Segundos entre notas de un carril (sin solaparse)
+MUSIC_SYNC_TOLERANCE = 0.05     # Segundos de deriva antes de realinear con el audio
+AUTO_CHART = True               # Sin partitura propia: generarla de los pulsos del tema (beatmap.py)
+CHART_CACHE_DIR = "charts"      # Partituras generadas, por hash del audio
+
+# Simulacion con paso fijo (independiente de los FPS de render)
+TARGET_FPS = 30
+SIM_TIMESTEP = 1.0 / 120    # Segundos por paso de simulacion
+MAX_FRAME_TIME = 0.25       # Tope de tiempo simulado por frame (evita espirales)
+
+# Compensacion de latencia en el juicio
+LATENCY_OFFSET = 0.0        # Segundos entre el movimiento real y el timestamp del frame
+POSE_HISTORY_SIZE = 120     # Observaciones de pose guardadas (~2 s a 60 Hz)
+JUDGE_TIMEOUT = 0.5         # Espera maxima por una observacion posterior al cruce
+CALIBRATION_PATH = "calibration.json"
+CALIBRATION_BEATS = 8       # Pulsos de la rutina de calibracion
+CALIBRATION_PERIOD = 1.5    # Segundos entre pulsos
+CALIBRATION_LEAD_IN = 2.0   # Segundos antes del primer pulso
+
+# Registro de poses: reglas sobre coordenadas normalizadas por el ancho de hombros
+# (1.0 = un ancho de hombros) y angulos articulares en grados, p. ej.
+# "angle(right_shoulder, right_elbow, right_wrist) > 150".
+# Si existe POSE_REGISTRY_PATH (junto a main.py), sus "poses" y "thresholds" reemplazan a estos.
+POSE_REGISTRY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "poses.json")
+POSE_THRESHOLDS = {
+    "y_dist_vert": 0.4,   # Umbral para arriba/abajo
+    "x_dist_ext": 0.2,    # Umbral minimo de extension lateral
+    "y_tol_side": 1.3     # Tolerancia vertical para brazos laterales
+}
+POSE_DEFINITIONS = [
+    {"key": "arms_up", "name": "BRAZOS ARRIBA", "color": (255, 255, 0), "rules": [
+        "left_wrist.y < left_shoulder.y - y_dist_vert",
+        "right_wrist.y < right_shoulder.y - y_dist_vert"]},
+    {"key": "right_arm", "name": "BRAZO DERECHO ->", "color": (255, 100, 100), "rules": [
+        "right_wrist.x > right_shoulder.x + x_dist_ext",
+        "abs(right_wrist.y - right_shoulder.y) < y_tol_side"]},
+    {"key": "left_arm", "name": "BRAZO IZQUIERDO <-", "color": (100, 100, 255), "rules": [
+        "left_wrist.x < left_shoulder.x - x_dist_ext",
+        "abs(left_wrist.y - left_shoulder.y) < y_tol_side"]},
+    {"key": "arms_down", "name": "BRAZOS ABAJO", "color": (255, 0, 255), "rules": [
+        "left_wrist.y > left_shoulder.y + y_dist_vert",
+        "right_wrist.y > right_shoulder.y + y_dist_vert"]},
+    {"key": "arms_crossed", "name": "MODO X (CRUZADOS)", "color": (0, 255, 255), "rules": [
+        "left_wrist.x > right_wrist.x",
+        "left_wrist.y > left_shoulder.y",
+        "right_wrist.y > right_shoulder.y"]}
+]
+MIN_SHOULDER_WIDTH = 20     # Pixeles: evita escalas extremas con el jugador de perfil
+
+# Confianza minima por keypoint (keypoints.data de YOLO): por debajo se trata como ausente
+KEYPOINT_CONF_THRESHOLDS = {
+    5: 0.5,     # Hombro Izq
+    6: 0.5,     # Hombro Der
+    9: 0.4,     # Muneca Izq
+    10: 0.4     # Muneca Der
+}
+KEYPOINT_CONF_DEFAULT = 0.5  # Resto de keypoints usados por las reglas
+
+# Multijugador (una sola inferencia para todos)
+MAX_PLAYERS = 4
+PLAYER_IOU_MIN = 0.2           # IoU minimo para mantener la identidad de un jugador
+PLAYER_MAX_JUMP = 150          # Pixeles maximos entre centros si el IoU no alcanza
+PLAYER_LOST_TIMEOUT = 1.5      # Segundos sin ver a un jugador antes de liberar su carril
+MULTIPLAYER_KEYS = {pygame.K_2: 2, pygame.K_3: 3, pygame.K_4: 4}  # Teclas del menu
+PLAYER_COLORS = [
+    (0, 255, 157),    # Verde Neon
+    (255, 215, 0),    # Dorado
+    (67, 160, 255),   # Azul
+    (255, 80, 200)    # Rosa
+]
+
+# Grabacion de sesiones (keypoints por frame) para replay determinista
+RECORD_SESSIONS = False
+SESSIONS_DIR = "sessions"
+
+# Modelo de pose y backend de inferencia (solo CPU)
+POSE_MODEL_PATH = "yolov8n-pose.pt"
+INFERENCE_BACKEND = "torch"    # "torch", "onnx" (ONNX Runtime) u "openvino"
+WARMUP_RUNS = 2                # Pasadas de calentamiento al iniciar
+
+# Inferencia en segundo plano (no bloquea el bucle de render)
+ASYNC_INFERENCE = True
+INFERENCE_SIZE = 416           # Lado mayor de la entrada a YOLO (None = resolucion completa)
+INFERENCE_EVERY_N_FRAMES = 1   # Ejecutar la inferencia solo cada N frames
+LETTERBOX_COLOR = (114, 114, 114)
+
+# Omitir la inferencia si la escena no cambio (se reutilizan los keypoints anteriores)
+MOTION_GATING = True
+MOTION_SIZE = (160, 90)          # Resolucion del frame en grises que se compara
+MOTION_PIXEL_DELTA = 20          # Diferencia de gris para contar un pixel como cambiado
+MOTION_THRESHOLD = 0.005         # Fraccion de pixeles cambiados que dispara una inferencia
+MOTION_MIN_INFERENCE_RATE = 5.0  # Hz de inferencia real aunque la escena este quieta
+MOTION_TARGET_LEAD = 0.2         # Segundos antes de que un objetivo llegue a ACTIVATION_ZONE_X
+
+# Captura, inferencia y render en procesos separados (pipeline.py, memoria compartida)
+MULTIPROCESS_PIPELINE = False
+PIPELINE_RING_SLOTS = 3        # Frames en el buffer circular compartido
+PIPELINE_MAX_PEOPLE = 8        # Personas maximas en el slot de keypoints
+
+# Recorte de la entrada a YOLO alrededor de la ultima persona detectada
+ROI_CROPPING = True
+ROI_MARGIN = 0.35              # Expansion de la caja por lado (fraccion de su ancho/alto)
+ROI_FULL_SCAN_INTERVAL = 15    # Inferencias entre barridos del frame completo (personas nuevas)
+ROI_MAX_AREA = 0.6             # Si el recorte supera esta fraccion del frame, se usa el frame completo
+ROI_MIN_INFERENCE_SIZE = 160   # Lado minimo de la entrada a YOLO al recortar
+
+# Suavizado temporal de keypoints (filtro One-Euro)
+SMOOTH_KEYPOINTS = True
+TRACKED_KEYPOINTS = (5, 6, 9, 10)   # Hombros y munecas
+ONE_EURO_MIN_CUTOFF = 1.0           # Hz: menor = mas suave en reposo
+ONE_EURO_BETA = 0.01                # Mayor = menos retraso en movimientos rapidos
+ONE_EURO_D_CUTOFF = 1.0             # Hz: filtro de la velocidad
+MAX_EXTRAPOLATION = 0.15            # Segundos maximos de prediccion entre inferencias
 
 # Paleta de Colores (Cyberpunk / Neon)
 COLOR_BG = (15, 23, 42)          # Azul oscuro solido
@@ -31,266 +164,1876 @@ COLOR_BLACK = (0, 0, 0)
 COLOR_TEXT_DIM = (148, 163, 184)
 COLOR_GOLD = (255, 215, 0)
 
+# Cache de textos renderizados (entradas maximas)
+TEXT_CACHE_SIZE = 256
+
+# Menu: actualizar solo las zonas que cambian (pygame.display.update(rects))
+DIRTY_RECT_MENU = True
+
+# Instrumentacion del frame (F3 muestra el overlay)
+SHOW_PERF_OVERLAY = False
+PROFILER_WINDOW = 120           # Frames en la ventana movil de estadisticas
+PERF_OVERLAY_REFRESH = 0.5      # Segundos entre actualizaciones del overlay
+PROFILE_TRACE_PATH = None       # "trace.csv" o "trace.jsonl" para volcar tiempos por frame
+PROFILER_STAGES = ["captura", "inferencia", "seguimiento", "poses", "simulacion",
+                   "dibujo", "menu", "ui", "presentacion", "espera"]
+
+# Gobernador de calidad: baja o sube la carga para sostener el presupuesto de frame
+QUALITY_GOVERNOR = True
+FRAME_TIME_BUDGET = 1.0 / TARGET_FPS   # Segundos de trabajo por frame (sin contar la espera)
+GOVERNOR_SMOOTHING = 0.1        # Peso de cada frame en la media movil de la carga
+GOVERNOR_DOWNGRADE_RATIO = 1.0  # Bajar calidad si la carga supera el presupuesto...
+GOVERNOR_DOWNGRADE_TIME = 1.0   # ...durante estos segundos
+GOVERNOR_UPGRADE_RATIO = 0.7    # Subir solo si la carga queda bajo el 70% del presupuesto...
+GOVERNOR_UPGRADE_TIME = 5.0     # ...durante estos segundos (se duplica si la subida no se sostuvo)
+GOVERNOR_MAX_UPGRADE_TIME = 60.0
+GOVERNOR_COOLDOWN = 2.0         # Segundos sin cambios tras cada ajuste
+QUALITY_LEVELS = [              # De mayor a menor calidad
+    {"inference_size": INFERENCE_SIZE, "inference_interval": INFERENCE_EVERY_N_FRAMES,
+     "capture_size": (WINDOW_WIDTH, WINDOW_HEIGHT), "effects": True},
+    {"inference_size": 352, "inference_interval": 1, "capture_size": (WINDOW_WIDTH, WINDOW_HEIGHT), "effects": True},
+    {"inference_size": 320, "inference_interval": 1, "capture_size": (960, 540), "effects": False},
+    {"inference_size": 256, "inference_interval": 2, "capture_size": (960, 540), "effects": False},
+    {"inference_size": 224, "inference_interval": 2, "capture_size": (640, 360), "effects": False},
+    {"inference_size": 192, "inference_interval": 3, "capture_size": (640, 360), "effects": False}
+]
+
+# Arranque: historial de tiempos (una linea JSON por inicio, None = no guardar)
+STARTUP_LOG_PATH = "startup_times.jsonl"
+
+#CACHE DE TEXTO
+class TextCache:
+    """
+    Registro compartido de fuentes y cache LRU de textos renderizados.
+    SysFont busca en las fuentes del sistema, asi que cada fuente se crea una sola vez,
+    y cada (fuente, texto, color) se renderiza una sola vez mientras siga en la cache.
+    """
+    def __init__(self, max_size=TEXT_CACHE_SIZE):
+        self.max_size = max_size
+        self.fonts = {}
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_font(self, size, bold=False, name="Arial"):
+        key = (name, size, bold)
+        font = self.fonts.get(key)
+        if font is None:
+            font = pygame.font.SysFont(name, size, bold=bold)
+            self.fonts[key] = font
+        return font
+
+    def render(self, font, text, color):
+        """Equivalente a font.render(text, True, color) con cache"""
+        key = (font, text, tuple(color))
+        surf = self.surfaces.get(key)
+        if surf is not None:
+            self.surfaces.move_to_end(key)
+            self.hits += 1
+            return surf
+        
+        self.misses += 1
+        surf = font.render(text, True, color)
+        self.surfaces[key] = surf
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)
+        return surf
+
+text_cache = TextCache()
+
+#INSTRUMENTACION
+class FrameProfiler:
+    """
+    Temporizadores por etapa del frame. Cada `lap` mide el tiempo desde la
+    marca anterior; las ultimas PROFILER_WINDOW muestras de cada etapa se
+    usan para el overlay y, opcionalmente, se vuelcan a un archivo CSV/JSONL.
+    """
+    def __init__(self, enabled=True, window=PROFILER_WINDOW, trace_path=PROFILE_TRACE_PATH):
+        self.enabled = enabled
+        self.window = window
+        self.samples = {}                     # etapa -> deque de ms
+        self.frame_samples = deque(maxlen=window)
+        self.events = {}                      # evento -> deque de timestamps
+        self.current = {}
+        self.frame_start = 0.0
+        self.last_lap = 0.0
+        self.frame_index = 0
+        
+        # Overlay
+        self.show_overlay = SHOW_PERF_OVERLAY
+        self.overlay_lines = []
+        self.overlay_updated = 0.0
+        
+        # Traza
+        self.trace_file = None
+        self.trace_csv = False
+        if enabled and trace_path:
+            self.open_trace(trace_path)
+
+    def open_trace(self, path):
+        try:
+            self.trace_file = open(path, "w")
+            self.trace_csv = path.endswith(".csv")
+            if self.trace_csv:
+                self.trace_file.write(",".join(["frame", "time", "total"] + PROFILER_STAGES) + "\n")
+            print(f"Traza de rendimiento: {path}")
+        except Exception as e:
+            print(f"Error al abrir traza de rendimiento: {e}")
+            self.trace_file = None
+
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        self.frame_start = self.last_lap = time.perf_counter()
+        self.current = {}
+
+    def lap(self, stage):
+        """Asigna a `stage` el tiempo transcurrido desde la marca anterior"""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.current[stage] = self.current.get(stage, 0.0) + (now - self.last_lap) * 1000
+        self.last_lap = now
+
+    def event(self, name):
+        """Registra una ocurrencia (p. ej. un resultado de inferencia) para medir su frecuencia"""
+        if not self.enabled:
+            return
+        events = self.events.get(name)
+        if events is None:
+            events = self.events[name] = deque(maxlen=self.window)
+        events.append(time.perf_counter())
+
+    def rate(self, name):
+        """Frecuencia en Hz de un evento dentro de la ventana"""
+        events = self.events.get(name)
+        if not events or len(events) < 2:
+            return 0.0
+        span = events[-1] - events[0]
+        return (len(events) - 1) / span if span > 0 else 0.0
+
+    def end_frame(self):
+        if not self.enabled:
+            return
+        total = (time.perf_counter() - self.frame_start) * 1000
+        self.frame_samples.append(total)
+        for stage, ms in self.current.items():
+            samples = self.samples.get(stage)
+            if samples is None:
+                samples = self.samples[stage] = deque(maxlen=self.window)
+            samples.append(ms)
+        if self.trace_file:
+            self.write_trace(total)
+        self.frame_index += 1
+
+    def write_trace(self, total):
+        now = time.monotonic()
+        if self.trace_csv:
+            row = [str(self.frame_index), f"{now:.6f}", f"{total:.3f}"]
+            row += [f"{self.current[s]:.3f}" if s in self.current else "" for s in PROFILER_STAGES]
+            self.trace_file.write(",".join(row) + "\n")
+        else:
+            record = {"frame": self.frame_index, "time": now, "total": round(total, 3),
+                      "stages": {k: round(v, 3) for k, v in self.current.items()}}
+            self.trace_file.write(json.dumps(record) + "\n")
+
+    def stats(self, samples):
+        """(media, p95, max) en ms de una ventana de muestras"""
+        values = np.fromiter(samples, dtype=np.float64)
+        return values.mean(), np.percentile(values, 95), values.max()
+
+    def toggle_overlay(self):
+        self.show_overlay = not self.show_overlay
+        self.overlay_updated = 0.0
+
+    def draw_overlay(self, screen):
+        """Dibuja el overlay de rendimiento y devuelve el rectangulo ocupado"""
+        if not self.enabled or not self.show_overlay or not self.frame_samples:
+            return None
+        
+        now = time.monotonic()
+        if now - self.overlay_updated >= PERF_OVERLAY_REFRESH:
+            self.overlay_updated = now
+            mean, p95, worst = self.stats(self.frame_samples)
+            fps = 1000.0 / mean if mean > 0 else 0.0
+            self.overlay_lines = [
+                f"FRAME {mean:5.1f} ms  p95 {p95:5.1f}  max {worst:5.1f}  ({fps:.0f} FPS)",
+                f"INFERENCIA {self.rate('inferencia'):.1f} Hz"
+            ]
+            for stage in PROFILER_STAGES:
+                if stage in self.samples:
+                    mean, p95, worst = self.stats(self.samples[stage])
+                    self.overlay_lines.append(f"{stage:<13}{mean:6.2f}  p95 {p95:6.2f}")
+        
+        font = text_cache.get_font(16, name="Courier New")
+        line_height = 18
+        rect = pygame.Rect(WINDOW_WIDTH - 390, 90, 380, 10 + line_height * len(self.overlay_lines))
+        # Fondo opaco: redibujarlo sobre si mismo (menu con dirty rects) no acumula
+        screen.fill(COLOR_BLACK, rect)
+        for i, line in enumerate(self.overlay_lines):
+            txt = text_cache.render(font, line, COLOR_ACCENT)
+            screen.blit(txt, (rect.x + 8, rect.y + 5 + i * line_height))
+        return rect
+
+    def close(self):
+        if self.trace_file:
+            self.trace_file.close()
+            self.trace_file = None
+
+class QualityGovernor:
+    """
+    Ajusta la calidad (QUALITY_LEVELS) segun el trabajo del frame en el hilo
+    principal (con inferencia sincronica, la incluye). Baja rapido y sube lento, con una banda muerta entre ambos umbrales y un
+    enfriamiento tras cada cambio, para no oscilar.
+    """
+    def __init__(self, levels=QUALITY_LEVELS, budget=FRAME_TIME_BUDGET, clock=time.monotonic):
+        self.levels = levels
+        self.budget = budget
+        self.clock = clock
+        self.index = 0
+        self.load = None                # Media movil de la carga (s)
+        self.over_since = None
+        self.under_since = None
+        self.last_change = None
+        self.last_upgrade = None
+        self.upgrade_time = GOVERNOR_UPGRADE_TIME
+
+    @property
+    def settings(self):
+        return self.levels[self.index]
+
+    def update(self, work_time, now=None):
+        """Registra un frame; devuelve True si cambio el nivel de calidad"""
+        if now is None:
+            now = self.clock()
+        if self.load is None:
+            self.load = work_time
+        else:
+            self.load += GOVERNOR_SMOOTHING * (work_time - self.load)
+        
+        if self.last_change is not None and now - self.last_change < GOVERNOR_COOLDOWN:
+            return False
+        ratio = self.load / self.budget
+        
+        if ratio > GOVERNOR_DOWNGRADE_RATIO and self.index < len(self.levels) - 1:
+            self.over_since = self.over_since if self.over_since is not None else now
+            if now - self.over_since >= GOVERNOR_DOWNGRADE_TIME:
+                # Una subida que no se sostuvo: la proxima espera el doble
+                if self.last_upgrade is not None and now - self.last_upgrade < self.upgrade_time * 2:
+                    self.upgrade_time = min(self.upgrade_time * 2, GOVERNOR_MAX_UPGRADE_TIME)
+                return self.set_level(self.index + 1, now)
+        else:
+            self.over_since = None
+        
+        if ratio < GOVERNOR_UPGRADE_RATIO and self.index > 0:
+            self.under_since = self.under_since if self.under_since is not None else now
+            if now - self.under_since >= self.upgrade_time:
+                self.last_upgrade = now
+                return self.set_level(self.index - 1, now)
+        else:
+            self.under_since = None
+        return False
+
+    def set_level(self, index, now=None):
+        index = max(0, min(index, len(self.levels) - 1))
+        changed = index != self.index
+        self.index = index
+        self.load = None
+        self.over_since = None
+        self.under_since = None
+        self.last_change = self.clock() if now is None else now
+        if changed:
+            settings = self.settings
+            width, height = settings["capture_size"]
+            print(f"Calidad {index + 1}/{len(self.levels)}: inferencia {settings['inference_size']} px "
+                  f"cada {settings['inference_interval']} frames, captura {width}x{height}, "
+                  f"efectos {'si' if settings['effects'] else 'no'}")
+        return changed
+
 #MOTOR DE CAMARA
 class CameraEngine:
-    def __init__(self):
+    def __init__(self, threaded=THREADED_CAPTURE, buffer_size=CAPTURE_BUFFER_SIZE,
+                 zero_copy=ZERO_COPY_DISPLAY, capture=None):
         try:
-            self.cap = cv2.VideoCapture(CAMERA_ID)
+            # `capture` permite usar otra fuente (video grabado, frames sinteticos)
+            self.cap = capture if capture is not None else cv2.VideoCapture(CAMERA_ID)
             if not self.cap.isOpened():
                 raise RuntimeError(f"No se pudo abrir la camara {CAMERA_ID}")
             
-            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, WINDOW_WIDTH)
-            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, WINDOW_HEIGHT)
+            if capture is None:
+                self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, WINDOW_WIDTH)
+                self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, WINDOW_HEIGHT)
+            # Resolucion pedida a la camara; por debajo de la ventana se escala al mostrar
+            self.owns_capture = capture is None
+            self.capture_size = (WINDOW_WIDTH, WINDOW_HEIGHT)
+            self.pending_capture_size = None
+            self.scaled_buffer = None
             self.last_frame_rgb = None
+            self.last_surface = None
+            
+            # Buffers preasignados para el camino sin copias
+            self.zero_copy = zero_copy
+            self.raw_buffer = None      # Lectura directa de la camara
+            self.mirror_buffer = None   # Frame espejado (BGR)
+            self.rgb_buffer = None      # Frame RGB compartido con la superficie
+            
+            # Buffer circular de frames (seq, timestamp, frame espejado BGR)
+            self.threaded = threaded
+            self.buffer = deque(maxlen=buffer_size)
+            self.buffer_lock = threading.Lock()
+            # La camara se libera cuando el hilo lector salio de cap.read()
+            self.release_lock = threading.Lock()
+            self.grabber_done = False
+            self.release_on_exit = False
+            self.running = False
+            self.thread = None
+            
+            # Contadores para medir perdida de frames
+            self.frame_seq = 0          # Frames capturados
+            self.last_frame_seq = -1    # Ultimo frame entregado al juego
+            self.last_frame_time = 0.0
+            self.dropped_frames = 0     # Capturados pero nunca mostrados
+            self.read_failures = 0
+            
+            if self.threaded:
+                self.running = True
+                self.thread = threading.Thread(target=self._capture_loop, name="CameraGrabber", daemon=True)
+                self.thread.start()
             print("Camara iniciada correctamente")
         except Exception as e:
             print(f"Error al iniciar camara: {e}")
             raise
 
-    def get_frame(self):
-        ret, frame = self.cap.read()
+    def set_capture_size(self, width, height):
+        """Cambia la resolucion de captura (con hilo lector, la aplica el propio hilo)"""
+        if not self.owns_capture or (width, height) == self.capture_size:
+            return
+        if self.threaded:
+            self.pending_capture_size = (width, height)
+        else:
+            self._apply_capture_size((width, height))
+
+    def _apply_capture_size(self, size):
+        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, size[0])
+        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, size[1])
+        self.capture_size = size
+        self.raw_buffer = None
+
+    def _scale_to_window(self, frame):
+        """Frames capturados por debajo de la resolucion de la ventana se escalan a ella"""
+        if self.capture_size == (WINDOW_WIDTH, WINDOW_HEIGHT) or frame.shape[:2] == (WINDOW_HEIGHT, WINDOW_WIDTH):
+            return frame
+        if self.scaled_buffer is None:
+            self.scaled_buffer = np.empty((WINDOW_HEIGHT, WINDOW_WIDTH, 3), dtype=np.uint8)
+        return cv2.resize(frame, (WINDOW_WIDTH, WINDOW_HEIGHT), self.scaled_buffer,
+                          interpolation=cv2.INTER_LINEAR)
+
+    def _read_mirrored(self, reuse_buffers=False, out=None):
+        """Lee y espeja un frame; con reuse_buffers escribe en `out` (o en mirror_buffer)"""
+        if not reuse_buffers:
+            ret, frame = self.cap.read()
+            if not ret:
+                return None
+            # Efecto Espejo
+            return cv2.flip(self._scale_to_window(frame), 1)
+        
+        # Lectura y espejado sobre buffers preasignados
+        ret, frame = self.cap.read(self.raw_buffer)
         if not ret:
-            print("Warning: No se pudo leer frame de la camara")
             return None
+        self.raw_buffer = frame
+        frame = self._scale_to_window(frame)
+        if out is None:
+            if self.mirror_buffer is None or self.mirror_buffer.shape != frame.shape:
+                self.mirror_buffer = np.empty_like(frame)
+            out = self.mirror_buffer
+        elif out.shape != frame.shape:
+            out = np.empty_like(frame)
+        return cv2.flip(frame, 1, out)
+
+    def _update_display(self, frame):
+        """Convierte a RGB escribiendo directamente en la superficie preasignada"""
+        if self.rgb_buffer is None or self.rgb_buffer.shape != frame.shape:
+            height, width = frame.shape[:2]
+            self.rgb_buffer = np.empty((height, width, 3), dtype=np.uint8)
+            # La superficie comparte memoria con rgb_buffer (sin copia)
+            self.last_surface = pygame.image.frombuffer(self.rgb_buffer, (width, height), "RGB")
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, self.rgb_buffer)
+        self.last_frame_rgb = self.rgb_buffer
+        return self.last_surface
+
+    def _capture_loop(self):
+        """Hilo lector: mantiene el buffer con los frames mas recientes"""
+        try:
+            self._grab_frames()
+        finally:
+            with self.release_lock:
+                self.grabber_done = True
+                release = self.release_on_exit
+            if release:
+                self._release_capture()
+
+    def _grab_frames(self):
+        # Frames espejados preasignados que rotan: los del buffer circular, el que se
+        # escribe y el que el juego puede estar convirtiendo (nunca se pisa uno entregado)
+        pool = [None] * (self.buffer.maxlen + 2)
+        slot = 0
+        while self.running:
+            if self.pending_capture_size is not None:
+                size, self.pending_capture_size = self.pending_capture_size, None
+                self._apply_capture_size(size)
+            if self.zero_copy:
+                if pool[slot] is None:
+                    pool[slot] = np.empty((WINDOW_HEIGHT, WINDOW_WIDTH, 3), dtype=np.uint8)
+                frame = self._read_mirrored(reuse_buffers=True, out=pool[slot])
+            else:
+                frame = self._read_mirrored()
+            timestamp = time.monotonic()
+            if frame is None:
+                self.read_failures += 1
+                time.sleep(0.01)
+                continue
+            if self.zero_copy:
+                pool[slot] = frame
+                slot = (slot + 1) % len(pool)
+            with self.buffer_lock:
+                self.buffer.append((self.frame_seq, timestamp, frame))
+                self.frame_seq += 1
+
+    def get_latest_entry(self):
+        """Devuelve (seq, timestamp, frame) del frame mas reciente o None"""
+        with self.buffer_lock:
+            return self.buffer[-1] if self.buffer else None
+
+    def get_frame(self):
+        if self.threaded:
+            entry = self.get_latest_entry()
+            if entry is None:
+                return self.last_surface
+            seq, timestamp, frame = entry
+            # Sin frame nuevo: se reutiliza la ultima superficie
+            if seq == self.last_frame_seq:
+                return self.last_surface
+            if self.last_frame_seq >= 0:
+                self.dropped_frames += seq - self.last_frame_seq - 1
+        else:
+            frame = self._read_mirrored(reuse_buffers=self.zero_copy)
+            timestamp = time.monotonic()
+            if frame is None:
+                self.read_failures += 1
+                print("Warning: No se pudo leer frame de la camara")
+                return None
+            seq = self.frame_seq
+            self.frame_seq += 1
         
-        # Efecto Espejo
-        frame = cv2.flip(frame, 1)
+        self.last_frame_seq = seq
+        self.last_frame_time = timestamp
+        if self.zero_copy:
+            return self._update_display(frame)
         
         self.last_frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
         frame_surface = np.transpose(self.last_frame_rgb, (1, 0, 2))
-        return pygame.surfarray.make_surface(frame_surface)
+        self.last_surface = pygame.surfarray.make_surface(frame_surface)
+        return self.last_surface
+
+    def get_stats(self):
+        return {
+            "captured": self.frame_seq,
+            "dropped": self.dropped_frames,
+            "read_failures": self.read_failures
+        }
 
     def release(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=1.0)
+            with self.release_lock:
+                if not self.grabber_done:
+                    # Sigue bloqueado en cap.read(): el propio hilo libera la camara al salir
+                    self.release_on_exit = True
+                    print("Camara ocupada: se liberara al terminar la lectura en curso")
+                    return
+            self.thread = None
+        self._release_capture()
+
+    def _release_capture(self):
         if self.cap:
             self.cap.release()
-            print("Camara liberada")
+            stats = self.get_stats()
+            print(f"Camara liberada (capturados: {stats['captured']}, "
+                  f"descartados: {stats['dropped']}, fallos: {stats['read_failures']})")
+
+#INFERENCIA DE POSE
+def letterbox_frame(frame, size):
+    """
+    Reduce el frame para que su lado mayor mida `size` y lo centra en un
+    lienzo cuadrado. Devuelve (imagen, escala, pad_x, pad_y).
+    """
+    height, width = frame.shape[:2]
+    scale = size / max(height, width)
+    new_w = int(round(width * scale))
+    new_h = int(round(height * scale))
+    pad_x = (size - new_w) // 2
+    pad_y = (size - new_h) // 2
+    
+    canvas = np.full((size, size, 3), LETTERBOX_COLOR, dtype=np.uint8)
+    canvas[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = cv2.resize(
+        frame, (new_w, new_h), interpolation=cv2.INTER_AREA
+    )
+    return canvas, scale, pad_x, pad_y
+
+def unletterbox_keypoints(keypoints, scale, pad_x, pad_y):
+    """
+    Lleva keypoints (17, 2|3) o (P, 17, 2|3) del lienzo reducido a coordenadas
+    de pantalla; la columna de confianza se conserva.
+    """
+    # YOLO marca los puntos no detectados con (0, 0): se conservan asi
+    missing = (keypoints[..., 0] == 0) & (keypoints[..., 1] == 0)
+    mapped = keypoints.copy()
+    mapped[..., 0] = (keypoints[..., 0] - pad_x) / scale
+    mapped[..., 1] = (keypoints[..., 1] - pad_y) / scale
+    mapped[missing] = 0
+    return mapped
+
+def unletterbox_boxes(boxes, scale, pad_x, pad_y):
+    """Lleva cajas (P, 4) en formato x1, y1, x2, y2 a coordenadas de pantalla"""
+    mapped = boxes.copy()
+    mapped[:, [0, 2]] = (boxes[:, [0, 2]] - pad_x) / scale
+    mapped[:, [1, 3]] = (boxes[:, [1, 3]] - pad_y) / scale
+    return mapped
+
+class RoiTracker:
+    """
+    Region de interes para la inferencia: la caja de las personas del
+    resultado anterior, expandida. Se vuelve al frame completo cada
+    ROI_FULL_SCAN_INTERVAL inferencias o cuando no se detecta a nadie.
+    """
+    def __init__(self, margin=ROI_MARGIN, full_scan_interval=ROI_FULL_SCAN_INTERVAL,
+                 max_area=ROI_MAX_AREA):
+        self.margin = margin
+        self.full_scan_interval = full_scan_interval
+        self.max_area = max_area
+        self.box = None                 # Union de las cajas del ultimo resultado
+        self.since_full_scan = 0
+        
+        # Estadisticas: pixeles del frame enviados a la inferencia
+        self.pixels_used = 0
+        self.pixels_total = 0
+        self.full_scans = 0
+        self.crops = 0
+
+    def region(self, height, width):
+        """(x1, y1, x2, y2) a recortar, o None para usar el frame completo"""
+        if self.box is None or self.since_full_scan >= self.full_scan_interval:
+            return None
+        x1, y1, x2, y2 = self.box
+        pad_x = (x2 - x1) * self.margin
+        pad_y = (y2 - y1) * self.margin
+        x1 = max(0, int(x1 - pad_x))
+        y1 = max(0, int(y1 - pad_y))
+        x2 = min(width, int(math.ceil(x2 + pad_x)))
+        y2 = min(height, int(math.ceil(y2 + pad_y)))
+        if x2 <= x1 or y2 <= y1 or (x2 - x1) * (y2 - y1) > self.max_area * width * height:
+            return None
+        return x1, y1, x2, y2
+
+    def update(self, boxes, region, height, width):
+        """Registra el resultado de una inferencia (cajas en coordenadas del frame)"""
+        if region is None:
+            self.since_full_scan = 0
+            self.full_scans += 1
+            self.pixels_used += height * width
+        else:
+            self.since_full_scan += 1
+            self.crops += 1
+            self.pixels_used += (region[2] - region[0]) * (region[3] - region[1])
+        self.pixels_total += height * width
+        # Persona perdida: el siguiente frame se analiza completo
+        if len(boxes) == 0:
+            self.box = None
+        else:
+            self.box = (boxes[:, 0].min(), boxes[:, 1].min(), boxes[:, 2].max(), boxes[:, 3].max())
+
+    def pixel_ratio(self):
+        """Fraccion de los pixeles del frame que recibio la inferencia"""
+        return self.pixels_used / self.pixels_total if self.pixels_total else 1.0
+
+    def summary(self):
+        return (f"ROI: {self.crops} recortes, {self.full_scans} barridos completos, "
+                f"{self.pixel_ratio() * 100:.0f}% de los pixeles")
+
+class MotionGate:
+    """
+    Decide si un frame necesita inferencia comparando una version reducida
+    en escala de grises contra el frame de la ultima inferencia real (no
+    contra el anterior: asi un movimiento lento tambien se acumula).
+    """
+    def __init__(self, size=MOTION_SIZE, pixel_delta=MOTION_PIXEL_DELTA, threshold=MOTION_THRESHOLD,
+                 min_rate=MOTION_MIN_INFERENCE_RATE):
+        self.size = size
+        self.pixel_delta = pixel_delta
+        self.threshold = threshold
+        self.max_gap = 1.0 / min_rate
+        # Buffers reutilizados entre frames
+        self.small = None
+        self.gray = None
+        self.diff = None
+        self.mask = None
+        self.reference = None
+        self.reference_time = None      # Timestamp del frame de la ultima inferencia real
+        self.inferred = 0
+        self.skipped = 0
+
+    def motion(self, frame_rgb):
+        """Fraccion de pixeles que cambiaron respecto al frame de referencia"""
+        # INTER_LINEAR promedia unos pocos pixeles (atenua el ruido) y es ~20x mas barato que INTER_AREA
+        self.small = cv2.resize(frame_rgb, self.size, self.small, interpolation=cv2.INTER_LINEAR)
+        self.gray = cv2.cvtColor(self.small, cv2.COLOR_RGB2GRAY, self.gray)
+        if self.reference is None:
+            return 1.0
+        self.diff = cv2.absdiff(self.gray, self.reference, self.diff)
+        _, self.mask = cv2.threshold(self.diff, self.pixel_delta, 255, cv2.THRESH_BINARY, self.mask)
+        return cv2.countNonZero(self.mask) / self.mask.size
+
+    def should_infer(self, frame_rgb, frame_time, force=False):
+        """True si hay que inferir este frame (que pasa a ser la nueva referencia)"""
+        motion = self.motion(frame_rgb)
+        if (force or motion > self.threshold or self.reference_time is None
+                or frame_time - self.reference_time >= self.max_gap):
+            self.reference, self.gray = self.gray, self.reference
+            self.reference_time = frame_time
+            self.inferred += 1
+            return True
+        self.skipped += 1
+        return False
+
+    def summary(self):
+        total = self.inferred + self.skipped
+        return f"Inferencias omitidas por escena quieta: {self.skipped} de {total}"
+
+def roi_inference_size(inference_size, region, height, width):
+    """Lado de la entrada para un recorte: misma escala que el frame completo, multiplo de 32"""
+    crop_side = max(region[2] - region[0], region[3] - region[1])
+    size = int(math.ceil(inference_size * crop_side / max(height, width) / 32)) * 32
+    return max(ROI_MIN_INFERENCE_SIZE, min(size, inference_size))
+
+def run_pose_inference_all(model, frame_rgb, inference_size=INFERENCE_SIZE, roi=None):
+    """
+    Ejecuta YOLO una sola vez y devuelve (keypoints (P, 17, 3), cajas (P, 4))
+    de todas las personas detectadas. La tercera columna es la confianza de
+    cada keypoint. Con `roi` (RoiTracker) solo se analiza la zona de la
+    ultima persona; los resultados vuelven en coordenadas del frame.
+    """
+    region = None
+    if roi is not None:
+        height, width = frame_rgb.shape[:2]
+        region = roi.region(height, width)
+        if region is not None:
+            x1, y1, x2, y2 = region
+            frame_rgb = frame_rgb[y1:y2, x1:x2]
+            if inference_size:
+                inference_size = roi_inference_size(inference_size, region, height, width)
+    people, boxes = _run_pose_model(model, frame_rgb, inference_size)
+    if region is not None:
+        missing = (people[..., 0] == 0) & (people[..., 1] == 0)
+        people[..., 0] += x1
+        people[..., 1] += y1
+        people[missing, :2] = 0
+        boxes[:, [0, 2]] += x1
+        boxes[:, [1, 3]] += y1
+    if roi is not None:
+        roi.update(boxes, region, height, width)
+    return people, boxes
+
+def _run_pose_model(model, frame_rgb, inference_size):
+    """YOLO sobre `frame_rgb` (con letterbox si hay inference_size); resultados en sus coordenadas"""
+    try:
+        if inference_size:
+            image, scale, pad_x, pad_y = letterbox_frame(frame_rgb, inference_size)
+            results = model(image, stream=True, verbose=False, conf=0.5, imgsz=inference_size)
+        else:
+            image, scale, pad_x, pad_y = frame_rgb, 1.0, 0, 0
+            results = model(image, stream=True, verbose=False, conf=0.5)
+        for r in results:
+            if r.keypoints and len(r.keypoints.xy) > 0:
+                people = r.keypoints.data.cpu().numpy()
+                if people.shape[-1] == 2:
+                    # Modelo sin confianza por keypoint: 1 si el punto fue detectado
+                    detected = (people[..., 0] != 0) | (people[..., 1] != 0)
+                    people = np.concatenate([people, detected[..., None]], axis=-1)
+                boxes = r.boxes.xyxy.cpu().numpy()
+                if inference_size:
+                    people = unletterbox_keypoints(people, scale, pad_x, pad_y)
+                    boxes = unletterbox_boxes(boxes, scale, pad_x, pad_y)
+                return people, boxes
+    except Exception as e:
+        print(f"Error en inferencia YOLO: {e}")
+    return np.zeros((0, 17, 3), dtype=np.float32), np.zeros((0, 4), dtype=np.float32)
+
+def run_pose_inference(model, frame_rgb, inference_size=INFERENCE_SIZE, roi=None):
+    """Ejecuta YOLO sobre un frame y devuelve los keypoints de la primera persona"""
+    people, _ = run_pose_inference_all(model, frame_rgb, inference_size, roi)
+    return people[0] if len(people) > 0 else []
+
+class PoseBackend:
+    """
+    Envoltorio del modelo de pose con backend intercambiable:
+    PyTorch (.pt), ONNX Runtime u OpenVINO. Los modelos exportados
+    se guardan junto a los pesos y se reutilizan en los siguientes inicios.
+    """
+    EXPORT_BACKENDS = ("onnx", "openvino")
+
+    def __init__(self, backend=INFERENCE_BACKEND, weights=POSE_MODEL_PATH):
+        self.weights = weights
+        try:
+            self.model = self._load(backend)
+            self.backend = backend
+        except Exception as e:
+            if backend == "torch":
+                raise
+            print(f"Error al cargar backend {backend}: {e}")
+            print("Usando backend PyTorch")
+            self.model = self._load("torch")
+            self.backend = "torch"
+
+    def exported_path(self, backend):
+        base = os.path.splitext(self.weights)[0]
+        if backend == "onnx":
+            return base + ".onnx"
+        return base + "_openvino_model"
+
+    def _load(self, backend):
+        from ultralytics import YOLO
+        if backend == "torch":
+            return YOLO(self.weights)
+        if backend not in self.EXPORT_BACKENDS:
+            raise ValueError(f"Backend de inferencia desconocido: {backend}")
+        
+        path = self.exported_path(backend)
+        if not os.path.exists(path):
+            print(f"Exportando modelo a {backend} (solo la primera vez)...")
+            # Entrada dinamica para poder cambiar INFERENCE_SIZE sin reexportar
+            path = YOLO(self.weights).export(format=backend, dynamic=True)
+        return YOLO(path, task="pose")
+
+    def __call__(self, frame, **kwargs):
+        return self.model(frame, device="cpu", **kwargs)
+
+    def warmup(self, runs=WARMUP_RUNS, inference_size=INFERENCE_SIZE):
+        """Inferencias sobre un frame vacio para evitar el pico del primer frame"""
+        dummy = np.zeros((WINDOW_HEIGHT, WINDOW_WIDTH, 3), dtype=np.uint8)
+        start = time.monotonic()
+        for _ in range(runs):
+            run_pose_inference(self, dummy, inference_size)
+        elapsed_ms = (time.monotonic() - start) * 1000
+        print(f"Modelo calentado ({self.backend}, {runs} pasadas): {elapsed_ms:.0f} ms")
+
+class PoseWorker:
+    """
+    Hilo de inferencia desacoplado del render.
+    Siempre procesa el frame mas reciente (descarta los viejos) y publica
+    los ultimos keypoints junto con el timestamp del frame de origen.
+    """
+    def __init__(self, model, inference_size=INFERENCE_SIZE, roi=ROI_CROPPING):
+        self.model = model
+        self.inference_size = inference_size
+        self.roi = RoiTracker() if roi else None
+        self.lock = threading.Lock()
+        self.new_frame = threading.Event()
+        self.running = False
+        self.thread = None
+        
+        # Doble buffer propio: la camara puede reescribir su frame en el lugar
+        self.pending_frame = None
+        self.pending_buffer = None
+        self.work_buffer = None
+        self.pending_time = 0.0
+        self.last_submitted_time = None
+        
+        # Ultimo resultado publicado (primera persona y todas las personas)
+        self.keypoints = []
+        self.people = np.zeros((0, 17, 3), dtype=np.float32)
+        self.boxes = np.zeros((0, 4), dtype=np.float32)
+        self.keypoints_time = 0.0
+        self.result_id = 0
+        
+        # Estadisticas
+        self.dropped_frames = 0
+        self.last_latency = 0.0
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._loop, name="PoseWorker", daemon=True)
+        self.thread.start()
+        print("Inferencia asincrona iniciada")
+
+    def submit(self, frame_rgb, timestamp=None):
+        """Entrega un frame nuevo; si habia uno sin procesar se descarta"""
+        # La camara puede devolver el mismo frame varias veces
+        if timestamp is not None and timestamp == self.last_submitted_time:
+            return
+        self.last_submitted_time = timestamp
+        with self.lock:
+            if self.pending_frame is not None:
+                self.dropped_frames += 1
+            if self.pending_buffer is None or self.pending_buffer.shape != frame_rgb.shape:
+                self.pending_buffer = np.empty_like(frame_rgb)
+            np.copyto(self.pending_buffer, frame_rgb)
+            self.pending_frame = self.pending_buffer
+            self.pending_time = time.monotonic() if timestamp is None else timestamp
+        self.new_frame.set()
+
+    def get_latest(self):
+        """Devuelve (keypoints, timestamp) del ultimo resultado publicado"""
+        with self.lock:
+            return self.keypoints, self.keypoints_time
+
+    def get_latest_people(self):
+        """Devuelve (keypoints (P, 17, 3), cajas (P, 4), timestamp) de todas las personas"""
+        with self.lock:
+            return self.people, self.boxes, self.keypoints_time
+
+    def _loop(self):
+        while self.running:
+            if not self.new_frame.wait(0.1):
+                continue
+            with self.lock:
+                frame = self.pending_frame
+                frame_time = self.pending_time
+                self.pending_frame = None
+                # Intercambio de buffers: el siguiente submit escribe en el otro
+                self.pending_buffer, self.work_buffer = self.work_buffer, self.pending_buffer
+                self.new_frame.clear()
+            if frame is None:
+                continue
+            
+            start = time.monotonic()
+            people, boxes = run_pose_inference_all(self.model, frame, self.inference_size, self.roi)
+            
+            with self.lock:
+                self.keypoints = people[0] if len(people) > 0 else []
+                self.people = people
+                self.boxes = boxes
+                self.keypoints_time = frame_time
+                self.result_id += 1
+                self.last_latency = time.monotonic() - start
+
+    def stop(self):
+        self.running = False
+        self.new_frame.set()
+        if self.thread:
+            self.thread.join(timeout=1.0)
+            self.thread = None
+        print(f"Inferencia asincrona detenida (frames descartados: {self.dropped_frames})")
+        if self.roi:
+            print(self.roi.summary())
+
+#SEGUIMIENTO DE KEYPOINTS
+class OneEuroFilter:
+    """Filtro One-Euro sobre un punto (x, y): suaviza en reposo, sigue rapido en movimiento"""
+    def __init__(self, min_cutoff=ONE_EURO_MIN_CUTOFF, beta=ONE_EURO_BETA, d_cutoff=ONE_EURO_D_CUTOFF):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.reset()
+
+    def reset(self):
+        self.x_prev = None
+        self.dx_prev = None
+        self.t_prev = None
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        tau = 1.0 / (2 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def __call__(self, x, t):
+        if self.x_prev is None:
+            self.x_prev = x.copy()
+            self.dx_prev = np.zeros_like(x)
+            self.t_prev = t
+            return self.x_prev
+        
+        dt = t - self.t_prev
+        if dt <= 0:
+            return self.x_prev
+        
+        # Velocidad filtrada
+        dx = (x - self.x_prev) / dt
+        a_d = self._alpha(self.d_cutoff, dt)
+        dx_hat = a_d * dx + (1 - a_d) * self.dx_prev
+        
+        # Corte adaptativo segun la velocidad
+        cutoff = self.min_cutoff + self.beta * np.abs(dx_hat)
+        a = self._alpha(cutoff, dt)
+        x_hat = a * x + (1 - a) * self.x_prev
+        
+        self.x_prev = x_hat
+        self.dx_prev = dx_hat
+        self.t_prev = t
+        return x_hat
+
+class KeypointTracker:
+    """
+    Suaviza hombros y munecas entre resultados de YOLO y los extrapola
+    con su velocidad hasta el instante pedido.
+    """
+    def __init__(self, indices=TRACKED_KEYPOINTS):
+        self.filters = {i: OneEuroFilter() for i in indices}
+        self.keypoints = []
+        self.last_time = None
+
+    def update(self, keypoints, timestamp):
+        """Incorpora un resultado de inferencia (se ignora si ya se proceso)"""
+        if timestamp == self.last_time:
+            return
+        self.last_time = timestamp
+        
+        if len(keypoints) == 0:
+            self.keypoints = []
+            for f in self.filters.values():
+                f.reset()
+            return
+        
+        self.keypoints = np.array(keypoints, dtype=np.float32)
+        for i, f in self.filters.items():
+            if i >= len(self.keypoints):
+                continue
+            if not keypoint_valid(self.keypoints[i], KEYPOINT_CONF_THRESHOLDS.get(i, 0.0)):
+                f.reset()
+            else:
+                self.keypoints[i, :2] = f(self.keypoints[i, :2], timestamp)
+
+    def predict(self, timestamp):
+        """Keypoints estimados para `timestamp` (prediccion lineal acotada)"""
+        if len(self.keypoints) == 0:
+            return []
+        
+        predicted = self.keypoints.copy()
+        dt = min(max(timestamp - self.last_time, 0.0), MAX_EXTRAPOLATION)
+        if dt > 0:
+            for i, f in self.filters.items():
+                if f.dx_prev is not None and i < len(predicted):
+                    predicted[i, :2] += f.dx_prev * dt
+        return predicted
+
+#REGISTRO DE POSES
+KEYPOINT_NAMES = [
+    "nose", "left_eye", "right_eye", "left_ear", "right_ear",
+    "left_shoulder", "right_shoulder", "left_elbow", "right_elbow",
+    "left_wrist", "right_wrist", "left_hip", "right_hip",
+    "left_knee", "right_knee", "left_ankle", "right_ankle"
+]
+
+def keypoint_valid(point, threshold):
+    """Un keypoint cuenta si su confianza alcanza el umbral (sin confianza: si no es (0, 0))"""
+    if len(point) > 2:
+        return point[2] >= threshold
+    return point[0] != 0 or point[1] != 0
+
+def keypoint_index(name):
+    if name not in KEYPOINT_NAMES:
+        raise ValueError(f"Keypoint desconocido: {name}")
+    return KEYPOINT_NAMES.index(name)
+
+def parse_pose_feature(term):
+    """'left_wrist.y' -> ('y', 9); 'angle(a, b, c)' -> ('angle', ia, ib, ic)"""
+    match = re.fullmatch(r"angle\(\s*(\w+)\s*,\s*(\w+)\s*,\s*(\w+)\s*\)", term)
+    if match:
+        return ("angle",) + tuple(keypoint_index(name) for name in match.groups())
+    name, _, axis = term.partition(".")
+    if axis not in ("x", "y"):
+        raise ValueError(f"Termino invalido: {term}")
+    return (axis, keypoint_index(name))
+
+NUMBER_PATTERN = r"(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?"
+
+def parse_linear(expr, thresholds):
+    """Suma de caracteristicas, umbrales con nombre y numeros -> (coeficientes, constante)"""
+    coeffs = {}
+    const = 0.0
+    # Los numeros van primero: el signo de un exponente (1e-3) no separa terminos
+    for sign, term in re.findall(rf"([+-]?)\s*({NUMBER_PATTERN}(?=\s*(?:[+-]|$))|[^+\-\s][^+-]*)", expr.strip()):
+        weight = -1.0 if sign == "-" else 1.0
+        term = term.strip()
+        if term in thresholds:
+            const += weight * thresholds[term]
+        elif re.fullmatch(NUMBER_PATTERN, term):
+            const += weight * float(term)
+        else:
+            key = parse_pose_feature(term)
+            coeffs[key] = coeffs.get(key, 0.0) + weight
+    return coeffs, const
+
+def parse_pose_rule(rule, thresholds):
+    """
+    'a op b' con op en <, <=, >, >= -> regla lineal: sign * (g(coeffs . f + c_in) + c_out) > 0
+    (o >= 0), con g = abs si el lado izquierdo es abs(...).
+    """
+    match = re.fullmatch(r"\s*(.+?)\s*(<=|>=|<|>)\s*(.+?)\s*", rule)
+    if not match:
+        raise ValueError(f"Regla invalida: {rule}")
+    lhs, op, rhs = match.groups()
+    is_abs = lhs.startswith("abs(") and lhs.endswith(")")
+    if is_abs:
+        lhs = lhs[4:-1]
+    l_coeffs, l_const = parse_linear(lhs, thresholds)
+    r_coeffs, r_const = parse_linear(rhs, thresholds)
+
+    if is_abs:
+        if r_coeffs:
+            raise ValueError(f"abs() solo se compara con una constante: {rule}")
+        coeffs, c_in, c_out = l_coeffs, l_const, -r_const
+    else:
+        coeffs = dict(l_coeffs)
+        for key, weight in r_coeffs.items():
+            coeffs[key] = coeffs.get(key, 0.0) - weight
+        c_in, c_out = l_const - r_const, 0.0
+    return {
+        "coeffs": coeffs,
+        "c_in": c_in,
+        "c_out": c_out,
+        "abs": is_abs,
+        "sign": 1.0 if op[0] == ">" else -1.0,
+        "strict": len(op) == 1
+    }
+
+class PoseEvaluator:
+    """
+    Poses declarativas compiladas una sola vez a matrices de NumPy: cada
+    frame cuesta un producto matricial sin importar cuantas poses haya.
+    Las coordenadas se normalizan por el ancho de hombros (invariante a la
+    distancia del jugador a la camara).
+    """
+    def __init__(self, definitions=POSE_DEFINITIONS, thresholds=POSE_THRESHOLDS):
+        self.definitions = definitions
+        self.thresholds = dict(thresholds)
+        self.keys = [d.get("key", d["name"]) for d in definitions]
+        self.names = [d["name"] for d in definitions]
+        self.colors = [tuple(d.get("color", COLOR_WHITE)) for d in definitions]
+        self.count = len(definitions)
+
+        # Reglas y caracteristicas (coordenadas o angulos) en orden de aparicion
+        rules = []
+        features = []
+        for pose, definition in enumerate(definitions):
+            for rule in definition["rules"]:
+                parsed = parse_pose_rule(rule, self.thresholds)
+                rules.append((pose, parsed))
+                features.extend(key for key in parsed["coeffs"] if key not in features)
+
+        self.coeffs = np.zeros((len(rules), len(features)))
+        self.c_in = np.array([r["c_in"] for _, r in rules])
+        self.c_out = np.array([r["c_out"] for _, r in rules])
+        self.sign = np.array([r["sign"] for _, r in rules])
+        self.strict = np.array([r["strict"] for _, r in rules], dtype=bool)
+        self.abs_rules = np.array([r["abs"] for _, r in rules], dtype=bool)
+        self.membership = np.zeros((self.count, len(rules)), dtype=bool)
+
+        # Los hombros siempre hacen falta: definen la escala
+        required = np.zeros((self.count, len(KEYPOINT_NAMES)), dtype=bool)
+        required[:, [5, 6]] = True
+        for r, (pose, parsed) in enumerate(rules):
+            self.membership[pose, r] = True
+            for key, weight in parsed["coeffs"].items():
+                self.coeffs[r, features.index(key)] = weight
+                required[pose, list(key[1:])] = True
+
+        self.used = np.flatnonzero(required.any(axis=0))
+        self.required = required[:, self.used]
+        self.conf_min = np.array([KEYPOINT_CONF_THRESHOLDS.get(i, KEYPOINT_CONF_DEFAULT)
+                                  for i in self.used], dtype=np.float32)
+
+        points = [(col, key) for col, key in enumerate(features) if key[0] != "angle"]
+        self.point_cols = np.array([col for col, _ in points], dtype=int)
+        self.point_axis = np.array([0 if key[0] == "x" else 1 for _, key in points], dtype=int)
+        self.point_index = np.array([key[1] for _, key in points], dtype=int)
+        angles = [(col, key[1:]) for col, key in enumerate(features) if key[0] == "angle"]
+        self.angle_cols = np.array([col for col, _ in angles], dtype=int)
+        self.angle_index = np.array([joints for _, joints in angles], dtype=int).reshape(-1, 3)
+
+    def with_thresholds(self, overrides):
+        """Mismas poses con algunos umbrales reemplazados (para barridos)"""
+        return PoseEvaluator(self.definitions, {**self.thresholds, **overrides})
+
+    def index(self, key, default=0):
+        return self.keys.index(key) if key in self.keys else default
+
+    def features(self, xy):
+        """Caracteristicas (N, F) de keypoints (N, 17, 2) en pixeles"""
+        xy = xy.astype(np.float64)
+        mid = (xy[:, 5] + xy[:, 6]) / 2
+        width = np.maximum(np.linalg.norm(xy[:, 5] - xy[:, 6], axis=1), MIN_SHOULDER_WIDTH)
+
+        out = np.empty((len(xy), self.coeffs.shape[1]))
+        if len(self.point_cols):
+            coords = xy[:, self.point_index, self.point_axis] - mid[:, self.point_axis]
+            out[:, self.point_cols] = coords / width[:, None]
+        if len(self.angle_cols):
+            a, b, c = self.angle_index.T
+            v1 = xy[:, a] - xy[:, b]
+            v2 = xy[:, c] - xy[:, b]
+            norms = np.linalg.norm(v1, axis=2) * np.linalg.norm(v2, axis=2)
+            cos = (v1 * v2).sum(axis=2) / np.maximum(norms, 1e-6)
+            out[:, self.angle_cols] = np.degrees(np.arccos(np.clip(cos, -1.0, 1.0)))
+        return out
+
+    def classify(self, keypoints, conf=None):
+        """
+        keypoints: (N, 17, 2|3), conf: (N, 17) opcional -> matriz (N, poses) de bool.
+        Sin `conf` se usa la tercera columna de keypoints si existe.
+        """
+        kp = np.asarray(keypoints, dtype=np.float32)
+        poses = np.zeros((len(kp), self.count), dtype=bool)
+        if len(kp) == 0:
+            return poses
+        if conf is None:
+            if kp.shape[-1] > 2:
+                conf = kp[..., 2]
+            else:
+                conf = ((kp[..., 0] != 0) | (kp[..., 1] != 0)).astype(np.float32)
+        conf = np.asarray(conf, dtype=np.float32)
+
+        # Poses evaluables: todos sus keypoints sobre el umbral de confianza
+        valid = conf[:, self.used] >= self.conf_min
+        evaluable = ~((~valid) @ self.required.T)
+
+        # Salida rapida: solo se evaluan los frames con alguna pose posible
+        rows = np.flatnonzero(evaluable.any(axis=1))
+        if len(rows) == 0:
+            return poses
+
+        raw = self.features(kp[rows, :, :2]) @ self.coeffs.T + self.c_in
+        raw[:, self.abs_rules] = np.abs(raw[:, self.abs_rules])
+        margin = (raw + self.c_out) * self.sign
+        passed = np.where(self.strict, margin > 0, margin >= 0)
+        poses[rows] = evaluable[rows] & ~((~passed) @ self.membership.T)
+        return poses
+
+    def active_poses(self, keypoints):
+        """Conjunto de poses activas para los keypoints (17, 2|3) de una persona"""
+        if len(keypoints) < len(KEYPOINT_NAMES):
+            return set()
+        return set(np.flatnonzero(self.classify(np.asarray(keypoints)[None])[0]).tolist())
+
+def load_pose_registry(path=POSE_REGISTRY_PATH):
+    """Compila las poses de `path` si existe; si no (o si es invalido), las de POSE_DEFINITIONS"""
+    if os.path.exists(path):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            registry = PoseEvaluator(data.get("poses", POSE_DEFINITIONS),
+                                     {**POSE_THRESHOLDS, **data.get("thresholds", {})})
+            print(f"Poses cargadas: {path} ({registry.count} poses)")
+            return registry
+        except Exception as e:
+            print(f"Error al cargar poses de {path}: {e}")
+            print("Usando poses por defecto")
+    return PoseEvaluator()
+
+_pose_registry = None
+_pose_registry_lock = threading.Lock()
+
+def get_pose_registry():
+    """Registro de poses compilado la primera vez que se pide (importar main no lo carga)"""
+    global _pose_registry
+    with _pose_registry_lock:
+        if _pose_registry is None:
+            _pose_registry = load_pose_registry()
+        return _pose_registry
+
+def classify_poses_batch(keypoints, conf=None, thresholds=None):
+    """
+    Version vectorizada de LevelBody.detect_active_poses: matriz (N, poses) de bool.
+    `thresholds` sobreescribe umbrales del registro (para barridos).
+    """
+    registry = get_pose_registry()
+    if thresholds:
+        registry = registry.with_thresholds(thresholds)
+    return registry.classify(keypoints, conf)
+
+#GRABACION Y REPLAY
+SESSION_DTYPE = np.dtype([
+    ("clock", np.float64),            # Reloj de la simulacion en el frame
+    ("frame_time", np.float64),       # Captura del frame mostrado (nan si no hay)
+    ("keypoints_time", np.float64),   # Captura del frame de origen de los keypoints
+    ("has_pose", np.bool_),
+    ("keypoints", np.float32, (17, 2)),
+    ("conf", np.float32, (17,)),
+    ("song_start", np.float64),       # Inicio del tema segun MusicClock (nan sin partitura)
+])
+
+class SessionRecorder:
+    """Graba por frame los keypoints que recibe LevelBody en un arreglo estructurado de NumPy"""
+    def __init__(self, seed, capacity=4096):
+        self.seed = seed
+        self.data = np.zeros(capacity, dtype=SESSION_DTYPE)
+        self.count = 0
+
+    def record(self, now, frame_time, keypoints, keypoints_time, conf=None):
+        if self.count == len(self.data):
+            self.data = np.concatenate([self.data, np.zeros(len(self.data), dtype=SESSION_DTYPE)])
+        i = self.count
+        self.data["clock"][i] = now
+        self.data["frame_time"][i] = np.nan if frame_time is None else frame_time
+        self.data["keypoints_time"][i] = keypoints_time
+        self.data["song_start"][i] = np.nan
+        if len(keypoints) >= 17:
+            keypoints = np.asarray(keypoints)[:17]
+            self.data["has_pose"][i] = True
+            self.data["keypoints"][i] = keypoints[:, :2]
+            if conf is None:
+                # Confianza del modelo si viene en los keypoints, si no 1 si el punto fue detectado
+                conf = keypoints[:, 2] if keypoints.shape[1] > 2 else (keypoints[:, 0] != 0)
+            self.data["conf"][i] = conf
+        self.count += 1
+
+    def record_song_start(self, song_start):
+        """Anclaje del tema usado en el ultimo frame (se realinea despues de grabar los keypoints)"""
+        if self.count and song_start is not None:
+            self.data["song_start"][self.count - 1] = song_start
+
+    def save(self, path, **metadata):
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            np.savez_compressed(path, frames=self.data[:self.count], seed=self.seed,
+                                meta=json.dumps(metadata))
+            print(f"Sesion grabada: {path} ({self.count} frames)")
+        except Exception as e:
+            print(f"Error al guardar sesion: {e}")
+
+def load_session(path):
+    """Devuelve (frames, seed, metadata) de una sesion grabada"""
+    with np.load(path) as f:
+        return f["frames"], int(f["seed"]), json.loads(str(f["meta"]))
+
+#PARTITURAS
+class Chart:
+    """
+    Notas de un tema (segundo del tema en que el objetivo cruza la zona de
+    activacion, tipo de pose, carril) en arreglos ordenados por tiempo:
+    ubicar las proximas notas cuesta O(log n) aun en temas largos.
+    """
+    def __init__(self, times, poses, lanes, offset=0.0):
+        order = np.argsort(np.asarray(times, dtype=np.float64), kind="stable")
+        self.times = np.asarray(times, dtype=np.float64)[order] + offset
+        self.poses = np.asarray(poses, dtype=np.int16)[order]
+        self.lanes = np.asarray(lanes, dtype=np.int16)[order]
+        self.path = None
+
+    def __len__(self):
+        return len(self.times)
+
+    def index_at(self, song_time):
+        """Indice de la primera nota con tiempo >= song_time"""
+        return int(np.searchsorted(self.times, song_time, side="left"))
+
+    def index_after(self, song_time):
+        """Indice de la primera nota con tiempo > song_time"""
+        return int(np.searchsorted(self.times, song_time, side="right"))
+
+    def save(self, path, registry=None):
+        """Guarda la partitura en JSON (pose por clave del registro)"""
+        registry = registry or get_pose_registry()
+        notes = [{"time": round(float(t), 4), "pose": registry.keys[p], "lane": int(l)}
+                 for t, p, l in zip(self.times, self.poses, self.lanes)]
+        with open(path, "w") as f:
+            json.dump({"notes": notes}, f, indent=1)
+
+def load_chart(path, registry=None):
+    """
+    Lee una partitura JSON: {"offset": s, "notes": [{"time": s, "pose": clave|indice, "lane": n}]}.
+    Devuelve None si no existe o es invalida.
+    """
+    if not path or not os.path.exists(path):
+        return None
+    registry = registry or get_pose_registry()
+    try:
+        with open(path) as f:
+            data = json.load(f)
+        times, poses, lanes = [], [], []
+        for note in data["notes"]:
+            pose = note["pose"]
+            if isinstance(pose, str):
+                if pose not in registry.keys:
+                    raise ValueError(f"Pose desconocida: {pose}")
+                pose = registry.keys.index(pose)
+            if not 0 <= pose < registry.count:
+                raise ValueError(f"Pose fuera de rango: {pose}")
+            times.append(float(note["time"]))
+            poses.append(pose)
+            lanes.append(int(note.get("lane", 0)))
+        if not times:
+            # Sin notas el nivel terminaria en el primer paso de simulacion
+            raise ValueError("la partitura no tiene notas")
+        chart = Chart(times, poses, lanes, offset=float(data.get("offset", 0.0)))
+        chart.path = path
+        print(f"Partitura cargada: {path} ({len(chart)} notas)")
+        return chart
+    except Exception as e:
+        print(f"Error al cargar partitura {path}: {e}")
+        return None
+
+class MusicClock:
+    """
+    Ubica el inicio del tema sobre el reloj monotono del juego (el mismo de
+    los frames de camara) y lo realinea con pygame.mixer.music.get_pos()
+    cuando la deriva supera la tolerancia.
+    """
+    def __init__(self, tolerance=MUSIC_SYNC_TOLERANCE):
+        self.tolerance = tolerance
+        self.song_start = None
+
+    def update(self, now):
+        """Devuelve el instante monotono en que empezo el tema"""
+        try:
+            position_ms = pygame.mixer.music.get_pos() if pygame.mixer.get_init() else -1
+        except pygame.error:
+            position_ms = -1
+        if position_ms < 0:
+            # Sin musica: el tema empieza con el primer frame
+            if self.song_start is None:
+                self.song_start = now
+            return self.song_start
+
+        audio_start = now - position_ms / 1000.0
+        if self.song_start is None or abs(audio_start - self.song_start) > self.tolerance:
+            self.song_start = audio_start
+        return self.song_start
+
+#POOLS DE OBJETOS
+class ArrayPool:
+    """
+    Almacen struct-of-arrays con lista libre: cada campo es un arreglo de
+    NumPy indexado por slot, asi que crear, actualizar y descartar elementos
+    se hace sobre arreglos sin crear objetos. Duplica su capacidad si se llena.
+    """
+    FIELDS = {}
+    CAPACITY = 64
+
+    def __init__(self, capacity=None):
+        capacity = capacity or self.CAPACITY
+        for name, dtype in self.FIELDS.items():
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+        self.active = np.zeros(capacity, dtype=bool)
+        self.free = list(range(capacity - 1, -1, -1))
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def _grow(self):
+        capacity = len(self.active)
+        for name in list(self.FIELDS) + ["active"]:
+            old = getattr(self, name)
+            new = np.zeros(capacity * 2, dtype=old.dtype)
+            new[:capacity] = old
+            setattr(self, name, new)
+        self.free.extend(range(capacity * 2 - 1, capacity - 1, -1))
+
+    def acquire(self, **values):
+        """Ocupa un slot libre con los valores dados y devuelve su indice"""
+        if not self.free:
+            self._grow()
+        slot = self.free.pop()
+        for name, value in values.items():
+            getattr(self, name)[slot] = value
+        self.active[slot] = True
+        self.count += 1
+        return slot
+
+    def release(self, slots):
+        """Devuelve los slots a la lista libre"""
+        for name, dtype in self.FIELDS.items():
+            if dtype is object:
+                getattr(self, name)[slots] = None
+        self.active[slots] = False
+        self.free.extend(slots.tolist())
+        self.count -= len(slots)
+
+    def slots(self):
+        """Indices de los elementos vivos"""
+        return np.flatnonzero(self.active)
+
+class TargetPool(ArrayPool):
+    CAPACITY = TARGET_POOL_SIZE
+    FIELDS = {
+        "x": np.float64,
+        "y": np.int32,
+        "type": np.int16,
+        "speed": np.float64,
+        "id": np.int64,
+        "checked": np.bool_     # Para evitar multiples evaluaciones
+    }
+
+class FeedbackPool(ArrayPool):
+    CAPACITY = FEEDBACK_POOL_SIZE
+    FIELDS = {
+        "x": np.float64,
+        "y": np.float64,
+        "lifetime": np.float64,
+        "surface": object       # Texto ya renderizado (superficie del TextCache)
+    }
 
 #RITMO
 class LevelBody:
-    def __init__(self, screen, model):
+    def __init__(self, screen, model, pose_worker=None, clock=None, latency_offset=LATENCY_OFFSET,
+                 profiler=None, seed=None, record=False, chart=None, song_start=None):
         self.screen = screen
         self.model = model
-        self.font = pygame.font.SysFont("Arial", 36, bold=True)
-        self.small_font = pygame.font.SysFont("Arial", 24)
+        self.pose_worker = pose_worker
+        self.profiler = profiler or FrameProfiler(enabled=False)
+        self.last_result_id = 0
+        
+        # Calidad vs latencia de la inferencia
+        self.inference_size = INFERENCE_SIZE
+        self.inference_interval = max(1, INFERENCE_EVERY_N_FRAMES)
+        self.roi = RoiTracker() if ROI_CROPPING else None   # Solo sin pose_worker (el worker tiene la suya)
+        self.full_effects = True
+        self.motion_gate = MotionGate() if MOTION_GATING else None
+        self.frame_count = 0
+        self.last_keypoints = []
+        self.last_keypoints_time = 0.0
+        self.tracker = KeypointTracker() if SMOOTH_KEYPOINTS else None
+        self.font = text_cache.get_font(36, bold=True)
+        self.small_font = text_cache.get_font(24)
         
         self.score = 0
         self.combo = 0
         self.max_combo = 0
         self.multiplier = 1
-        self.targets = []
-        self.spawn_timer = 0
+        self.targets = TargetPool()
+        self.spawn_timer = 0.0
         self.spawn_count = 0
+        self.spawn_y_range = (150, WINDOW_HEIGHT - 150)
+        
+        # Partitura: las notas se ubican con el reloj del tema (get_pos del mixer)
+        self.chart = chart
+        self.chart_index = None
+        self.chart_lead = (WINDOW_WIDTH - ACTIVATION_ZONE_X) / TARGET_SPEED
+        self.song_start = song_start
+        self.music_clock = MusicClock() if chart is not None and song_start is None else None
+        
+        # Generador propio de objetivos: con la misma semilla el replay es identico
+        self.seed = random.randrange(2**32) if seed is None else seed
+        self.rng = random.Random(self.seed)
+        self.recorder = SessionRecorder(self.seed) if record else None
+        
+        # Reloj monotono de la simulacion (se lee una vez por frame)
+        self.clock = clock or time.monotonic
+        self.frame_now = 0.0
+        self.last_sim_time = None
+        self.sim_time = 0.0
+        self.sim_accumulator = 0.0
+        self.finished = False
+        
+        # Historial de poses con timestamp de captura y juicios pendientes
+        self.latency_offset = latency_offset
+        self.pose_history = deque(maxlen=POSE_HISTORY_SIZE)
+        self.pending_judgements = deque()
         
         # Estadisticas
         self.hits = 0
         self.misses = 0
         
         # Efectos visuales
-        self.feedback_messages = []  # Para mostrar +puntos, MISS, etc.
-        
-        # Tipos de poses y colores
-        self.pose_names = [
-            "BRAZOS ARRIBA",      # 0
-            "BRAZO DERECHO ->",   # 1
-            "BRAZO IZQUIERDO <-", # 2
-            "BRAZOS ABAJO",       # 3
-            "MODO X (CRUZADOS)"   # 4
-        ]
-        self.pose_colors = [
-            (255, 255, 0),    # Amarillo
-            (255, 100, 100),  # Rojo claro
-            (100, 100, 255),  # Azul claro
-            (255, 0, 255),    # Magenta
-            (0, 255, 255)     # Cyan
-        ]
+        self.feedback = FeedbackPool()  # Para mostrar +puntos, MISS, etc.
+        
+        # Tipos de poses y colores (registro de poses)
+        registry = get_pose_registry()
+        self.pose_names = registry.names
+        self.pose_colors = registry.colors
+        
+        # Capas estaticas del HUD y sprites de objetivos (se crean una sola vez)
+        self.build_static_layers()
+
+    def save_recording(self):
+        """Guarda la sesion grabada (si la grabacion esta activa)"""
+        if not self.recorder or self.recorder.count == 0:
+            return None
+        path = os.path.join(SESSIONS_DIR, time.strftime("session_%Y%m%d_%H%M%S.npz"))
+        chart_metadata = {}
+        if self.chart is not None:
+            chart_metadata = {"chart": self.chart.path, "song_start": self.song_start}
+        self.recorder.save(
+            path,
+            latency_offset=self.latency_offset,
+            score=self.score,
+            hits=self.hits,
+            misses=self.misses,
+            **chart_metadata
+        )
+        return path
 
     def detect_active_poses(self, keypoints):
         """
-        Devuelve una lista de TODAS las poses detectadas simultaneamente.
+        Devuelve el conjunto de TODAS las poses detectadas simultaneamente
+        (reglas del registro de poses, ver POSE_DEFINITIONS).
         """
-        active_poses = set()
-        
-        if len(keypoints) < 13:
-            return active_poses
-        
-        # Extraer puntos clave (YOLO Format)
-        ls = keypoints[5]   # Hombro Izq
-        rs = keypoints[6]   # Hombro Der
-        lw = keypoints[9]   # Muneca Izq
-        rw = keypoints[10]  # Muneca Der
-
-        # Validar que los puntos existan
-        if lw[0] == 0 or rw[0] == 0 or ls[0] == 0 or rs[0] == 0:
-            return active_poses
-
-        # --- PARAMETROS DE DETECCION ---
-        y_dist_vert = 60   # Umbral para arriba/abajo
-        x_dist_ext = 30    # Umbral minimo de extension lateral
-        y_tol_side = 200   # Tolerancia vertical para brazos laterales
-
-        # POSE 4: MODO X (Brazos Cruzados)
-        arms_crossed = (lw[0] > rw[0]) and (lw[1] > ls[1]) and (rw[1] > rs[1])
-        if arms_crossed:
-            active_poses.add(4)
-
-        # POSE 0: Brazos Arriba
-        left_is_up = lw[1] < ls[1] - y_dist_vert
-        right_is_up = rw[1] < rs[1] - y_dist_vert
-        if left_is_up and right_is_up:
-            active_poses.add(0)
-            
-        # POSE 3: Brazos Abajo
-        left_is_down = lw[1] > ls[1] + y_dist_vert
-        right_is_down = rw[1] > rs[1] + y_dist_vert
-        if left_is_down and right_is_down:
-            active_poses.add(3)
-
-        # POSE 1: Brazo Derecho Extendido
-        right_is_side = (rw[0] > rs[0] + x_dist_ext) and (abs(rw[1] - rs[1]) < y_tol_side)
-        if right_is_side:
-            active_poses.add(1)
-            
-        # POSE 2: Brazo Izquierdo Extendido
-        left_is_side = (lw[0] < ls[0] - x_dist_ext) and (abs(lw[1] - ls[1]) < y_tol_side)
-        if left_is_side:
-            active_poses.add(2)
-        
-        return active_poses
-
-    def spawn_target(self):
-        pose_type = random.randint(0, 4)
-        y = random.randint(150, WINDOW_HEIGHT - 150)
-        
-        self.targets.append({
-            "x": WINDOW_WIDTH,
-            "y": y,
-            "type": pose_type,
-            "width": TARGET_WIDTH,
-            "height": TARGET_HEIGHT,
-            "speed": TARGET_SPEED,
-            "id": self.spawn_count,
-            "checked": False  # Para evitar multiples evaluaciones
-        })
+        return get_pose_registry().active_poses(keypoints)
+
+    def spawn_target(self, pose_type=None, y=None, x=WINDOW_WIDTH):
+        if pose_type is None:
+            pose_type = self.rng.randint(0, len(self.pose_names) - 1)
+        if y is None:
+            y = self.rng.randint(*self.spawn_y_range)
+        
+        self.targets.acquire(x=x, y=y, type=pose_type, speed=TARGET_SPEED,
+                             id=self.spawn_count, checked=False)
         self.spawn_count += 1
 
+    def lane_y(self, lane):
+        """Altura de un carril de la partitura dentro del rango de aparicion"""
+        top, bottom = self.spawn_y_range
+        lane = min(max(lane, 0), CHART_LANES - 1)
+        return top + (bottom - top) * lane // max(CHART_LANES - 1, 1)
+
+    def spawn_chart_notes(self):
+        """Crea los objetivos de las notas que ya deberian estar en pantalla"""
+        song_now = self.sim_time - self.song_start
+        if self.chart_index is None:
+            # Se omiten las notas cuyo cruce ya paso al empezar el nivel
+            self.chart_index = self.chart.index_at(song_now)
+        end = self.chart.index_after(song_now + self.chart_lead)
+        for i in range(self.chart_index, end):
+            # Posicion exacta para cruzar la zona de activacion en el tiempo de la nota
+            x = ACTIVATION_ZONE_X + TARGET_SPEED * (self.chart.times[i] - song_now)
+            self.spawn_target(int(self.chart.poses[i]), self.lane_y(int(self.chart.lanes[i])), x)
+        self.chart_index = max(self.chart_index, end)
+
     def add_feedback(self, text, x, y, color, size=36):
         """Anade un mensaje de feedback temporal"""
-        self.feedback_messages.append({
-            "text": text,
-            "x": x,
-            "y": y,
-            "color": color,
-            "size": size,
-            "lifetime": 30  # Frames que durara visible
-        })
-
-    def update(self, frame_rgb):
-        # 1. Inferencia YOLO con manejo de errores
-        try:
-            results = self.model(frame_rgb, stream=True, verbose=False, conf=0.5)
-            keypoints = []
-            for r in results:
-                if r.keypoints and len(r.keypoints.xy) > 0:
-                    keypoints = r.keypoints.xy[0].cpu().numpy()
-                    break
-        except Exception as e:
-            print(f"Error en inferencia YOLO: {e}")
-            keypoints = []
+        surface = text_cache.render(text_cache.get_font(size, bold=True), text, color)
+        self.feedback.acquire(x=x, y=y, lifetime=FEEDBACK_LIFETIME, surface=surface)
 
-        # 2. Detectar todas las poses activas
+    def update(self, frame_rgb, frame_time=None):
+        self.frame_now = self.clock()
+        
+        # 1. Inferencia YOLO (asincrona si hay worker, si no bloqueante)
+        keypoints, keypoints_time = self.acquire_keypoints(frame_rgb, frame_time)
+        if self.recorder:
+            self.recorder.record(self.frame_now, frame_time, keypoints, keypoints_time)
+        self.profiler.lap("inferencia")
+        
+        # Suavizado: el historial usa la observacion filtrada (sin extrapolar);
+        # la prediccion al instante del frame mostrado es solo para dibujar
+        display_keypoints = None
+        if self.tracker:
+            self.tracker.update(keypoints, keypoints_time)
+            display_time = frame_time if frame_time is not None else self.frame_now
+            display_keypoints = self.tracker.predict(display_time)
+            keypoints = self.tracker.keypoints
+        self.profiler.lap("seguimiento")
+
+        # 2. Detectar todas las poses activas y guardarlas con el timestamp de captura
         active_poses = self.detect_active_poses(keypoints)
+        self.record_poses(keypoints_time, active_poses)
+        if display_keypoints is not None:
+            active_poses = self.detect_active_poses(display_keypoints)
+        self.profiler.lap("poses")
+
+        # 3. Avanzar la simulacion segun el tiempo real transcurrido
+        self.advance_simulation(self.frame_now)
+        self.resolve_judgements(self.frame_now)
+        if self.recorder:
+            self.recorder.record_song_start(self.song_start)
+        self.profiler.lap("simulacion")
+
+        # 4. Dibujar UI (ARRIBA de todo)
+        self.draw_ui(active_poses)
+        self.profiler.lap("dibujo")
+
+    def acquire_keypoints(self, frame_rgb, frame_time):
+        """Devuelve (keypoints, timestamp de su frame de origen) para este frame"""
+        run_inference = self.frame_count % self.inference_interval == 0
+        self.frame_count += 1
+        if run_inference and self.motion_gate:
+            timestamp = frame_time if frame_time is not None else self.frame_now
+            if not self.motion_gate.should_infer(frame_rgb, timestamp, self.targets_near_zone()):
+                return self.reuse_keypoints(timestamp)
+        if self.pose_worker:
+            if run_inference:
+                self.pose_worker.submit(frame_rgb, frame_time)
+            keypoints, keypoints_time = self.pose_worker.get_latest()
+            if self.pose_worker.result_id != self.last_result_id:
+                self.last_result_id = self.pose_worker.result_id
+                self.profiler.event("inferencia")
+        elif run_inference:
+            keypoints = run_pose_inference(self.model, frame_rgb, self.inference_size, self.roi)
+            keypoints_time = frame_time if frame_time is not None else self.frame_now
+            self.last_keypoints = keypoints
+            self.last_keypoints_time = keypoints_time
+            self.profiler.event("inferencia")
+        else:
+            keypoints = self.last_keypoints
+            keypoints_time = self.last_keypoints_time
+        return keypoints, keypoints_time
+
+    def reuse_keypoints(self, frame_time):
+        """
+        Escena quieta: los keypoints del frame de referencia valen para este
+        frame, asi que se publican con su timestamp (el historial avanza).
+        """
+        if self.pose_worker:
+            keypoints, keypoints_time = self.pose_worker.get_latest()
+            # Si el resultado de la referencia aun no llego, se usa el ultimo tal cual
+            if keypoints_time == self.motion_gate.reference_time:
+                keypoints_time = frame_time
+            return keypoints, keypoints_time
+        # Los frames sin inferencia que siguen reutilizan este timestamp, no el de la referencia
+        self.last_keypoints_time = frame_time
+        return self.last_keypoints, frame_time
+
+    def targets_near_zone(self):
+        """True si algun objetivo esta por llegar a la zona de activacion o espera su juicio"""
+        if self.pending_judgements:
+            return True
+        slots = self.targets.slots()
+        if len(slots) == 0:
+            return False
+        targets = self.targets
+        time_to_zone = (targets.x[slots] - ACTIVATION_ZONE_X) / targets.speed[slots]
+        return bool(np.any((time_to_zone <= MOTION_TARGET_LEAD) & ~targets.checked[slots]))
+
+    def record_poses(self, pose_time, active_poses):
+        """Guarda la observacion de poses con el timestamp de captura del frame"""
+        if self.pose_history and pose_time <= self.pose_history[-1][0]:
+            return
+        self.pose_history.append((pose_time, frozenset(active_poses)))
 
-        # 3. Generar nuevos objetivos
-        self.spawn_timer += 1
-        if self.spawn_timer >= SPAWN_INTERVAL:
-            self.spawn_target()
-            self.spawn_timer = 0
+    def poses_at(self, timestamp):
+        """Poses de la observacion mas cercana a `timestamp`"""
+        if not self.pose_history:
+            return frozenset()
+        best_time, best_poses = self.pose_history[-1]
+        for obs_time, poses in reversed(self.pose_history):
+            if abs(obs_time - timestamp) < abs(best_time - timestamp):
+                best_time, best_poses = obs_time, poses
+            if obs_time < timestamp:
+                break
+        return best_poses
 
-        # 4. Mover y evaluar objetivos
-        to_remove = []
+    def advance_simulation(self, now=None):
+        """Ejecuta los pasos fijos de simulacion que correspondan al tiempo transcurrido"""
+        if now is None:
+            now = self.clock()
+        if self.last_sim_time is None:
+            self.last_sim_time = now
+            self.sim_time = now
+        if self.chart is not None:
+            if self.music_clock:
+                self.song_start = self.music_clock.update(now)
+            elif self.song_start is None:
+                self.song_start = now
+        elapsed = now - self.last_sim_time
+        self.last_sim_time = now
+        if elapsed > MAX_FRAME_TIME:
+            # El tiempo descartado no se simula, pero el reloj sigue alineado
+            self.sim_time += elapsed - MAX_FRAME_TIME
+            elapsed = MAX_FRAME_TIME
         
-        for target in self.targets:
-            target["x"] -= target["speed"]
+        self.sim_accumulator += elapsed
+        while self.sim_accumulator >= SIM_TIMESTEP:
+            self.step(SIM_TIMESTEP)
+            self.sim_time += SIM_TIMESTEP
+            self.sim_accumulator -= SIM_TIMESTEP
+
+    def step(self, dt):
+        """Un paso de simulacion de `dt` segundos: spawn, movimiento, cruces y feedback"""
+        # 1. Generar nuevos objetivos (partitura del tema o aleatorios)
+        if self.chart is not None:
+            self.spawn_chart_notes()
+        else:
+            self.spawn_timer += dt
+            if self.spawn_timer >= SPAWN_INTERVAL:
+                self.spawn_target()
+                self.spawn_timer -= SPAWN_INTERVAL
+
+        # 2. Mover objetivos (vectorizado) y registrar el instante exacto del cruce
+        targets = self.targets
+        slots = targets.slots()
+        if len(slots):
+            prev_x = targets.x[slots]
+            speed = targets.speed[slots]
+            x = prev_x - speed * dt
+            targets.x[slots] = x
             
-            # Si cruzo la zona de activacion y aun no fue checkeado
-            if target["x"] < ACTIVATION_ZONE_X and not target["checked"]:
-                target["checked"] = True
-                
-                # Verificar si la pose correcta esta activa
-                if target["type"] in active_poses:
-                    # ACIERTO
-                    if target["x"] > PERFECT_ZONE_X:
-                        points = 100
-                        feedback = "PERFECT!"
-                        color = COLOR_GOLD
-                    else:
-                        points = 50
-                        feedback = "GOOD"
-                        color = COLOR_ACCENT
-                    
-                    self.score += points * self.multiplier
-                    self.combo += 1
-                    self.hits += 1
-                    
-                    if self.combo > self.max_combo:
-                        self.max_combo = self.combo
-                    
-                    # Actualizar multiplicador
-                    if self.combo >= 20:
-                        self.multiplier = 4
-                    elif self.combo >= 10:
-                        self.multiplier = 2
-                    
-                    self.add_feedback(f"+{points * self.multiplier}", target["x"], target["y"], color)
-                else:
-                    # FALLO
-                    self.combo = 0
-                    self.multiplier = 1
-                    self.misses += 1
-                    self.add_feedback("MISS!", target["x"], target["y"], COLOR_DANGER)
+            # Los que cruzaron la zona de activacion y aun no fueron checkeados
+            crossed = np.flatnonzero((x < ACTIVATION_ZONE_X) & ~targets.checked[slots])
+            if len(crossed):
+                crossing_times = self.sim_time + (prev_x[crossed] - ACTIVATION_ZONE_X) / speed[crossed]
+                for i in np.argsort(crossing_times, kind="stable"):
+                    slot = slots[crossed[i]]
+                    targets.checked[slot] = True
+                    crossing_time = float(crossing_times[i])
+                    self.pending_judgements.append({
+                        "slot": int(slot),
+                        "id": int(targets.id[slot]),
+                        "type": int(targets.type[slot]),
+                        "y": int(targets.y[slot]),
+                        "x": float(x[crossed[i]]),
+                        "crossing_time": crossing_time,
+                        "judge_time": crossing_time + self.latency_offset
+                    })
             
-            # Marcar para eliminar si sale de pantalla
-            if target["x"] < -target["width"]:
-                to_remove.append(target)
-        
-        # Eliminar targets fuera de pantalla
-        for target in to_remove:
-            self.targets.remove(target)
-        
-        # 5. Actualizar mensajes de feedback
-        for msg in self.feedback_messages[:]:
-            msg["lifetime"] -= 1
-            msg["y"] -= 2  # Hacer que suba
-            if msg["lifetime"] <= 0:
-                self.feedback_messages.remove(msg)
-
-        # 6. Dibujar UI (ARRIBA de todo)
-        self.draw_ui(active_poses)
+            # Liberar los que salieron de pantalla
+            gone = slots[x < -TARGET_WIDTH]
+            if len(gone):
+                targets.release(gone)
+        
+        # 3. Actualizar mensajes de feedback (suben y se desvanecen)
+        feedback = self.feedback
+        slots = feedback.slots()
+        if len(slots):
+            feedback.lifetime[slots] -= dt
+            feedback.y[slots] -= FEEDBACK_RISE_SPEED * dt
+            expired = slots[feedback.lifetime[slots] <= 0]
+            if len(expired):
+                feedback.release(expired)
+        
+        # 4. Fin de la partitura: todas las notas aparecieron y fueron juzgadas
+        if (self.chart is not None and self.chart_index == len(self.chart)
+                and not self.targets and not self.pending_judgements):
+            self.finished = True
+
+    def resolve_judgements(self, now=None):
+        """
+        Juzga los cruces cuyo instante ya esta cubierto por el historial de poses
+        (o que esperaron demasiado), usando la pose en el momento del cruce.
+        """
+        if now is None:
+            now = self.clock()
+        latest = self.pose_history[-1][0] if self.pose_history else None
+        while self.pending_judgements:
+            pending = self.pending_judgements[0]
+            judge_time = pending["judge_time"]
+            ready = latest is not None and latest >= judge_time
+            if not ready and now - judge_time < JUDGE_TIMEOUT:
+                break
+            self.pending_judgements.popleft()
+            self.judge(pending, self.poses_at(judge_time))
+
+    def flush_judgements(self):
+        """Juzga los cruces pendientes al cortar la partida (en vivo y en replay igual)"""
+        self.resolve_judgements(self.frame_now + JUDGE_TIMEOUT)
+
+    def judge(self, pending, active_poses):
+        # Feedback donde esta el objetivo ahora (si su slot no fue reutilizado)
+        slot = pending["slot"]
+        target_x = pending["x"]
+        if self.targets.active[slot] and self.targets.id[slot] == pending["id"]:
+            target_x = float(self.targets.x[slot])
+        target_y = pending["y"]
+        
+        # Verificar si la pose correcta esta activa
+        if pending["type"] in active_poses:
+            # ACIERTO
+            if pending["x"] > PERFECT_ZONE_X:
+                points = 100
+                feedback = "PERFECT!"
+                color = COLOR_GOLD
+            else:
+                points = 50
+                feedback = "GOOD"
+                color = COLOR_ACCENT
+            
+            self.score += points * self.multiplier
+            self.combo += 1
+            self.hits += 1
+            
+            if self.combo > self.max_combo:
+                self.max_combo = self.combo
+            
+            # Actualizar multiplicador
+            if self.combo >= 20:
+                self.multiplier = 4
+            elif self.combo >= 10:
+                self.multiplier = 2
+            
+            self.add_feedback(f"+{points * self.multiplier}", target_x, target_y, color)
+        else:
+            # FALLO
+            self.combo = 0
+            self.multiplier = 1
+            self.misses += 1
+            self.add_feedback("MISS!", target_x, target_y, COLOR_DANGER)
+
+    def build_static_layers(self):
+        """Pre-renderiza los elementos del HUD que no cambian entre frames"""
+        # Panel superior translucido
+        self.panel_height = 80
+        self.panel_layer = pygame.Surface((WINDOW_WIDTH, self.panel_height))
+        self.panel_layer.set_alpha(200)
+        self.panel_layer.fill((10, 15, 30))
+        
+        # Fondos de las etiquetas de pose (inactiva / activa)
+        self.pose_bg_layers = []
+        for alpha in (100, 180):
+            pose_bg = pygame.Surface((200, 35))
+            pose_bg.set_alpha(alpha)
+            pose_bg.fill((20, 25, 40))
+            self.pose_bg_layers.append(pose_bg)
+        
+        # Etiquetas rotadas de las zonas
+        self.perfect_label = pygame.transform.rotate(
+            text_cache.render(self.small_font, "PERFECT", COLOR_GOLD), 90)
+        self.good_label = pygame.transform.rotate(
+            text_cache.render(self.small_font, "GOOD", COLOR_ACCENT), 90)
+        
+        # Sprite por tipo de pose: sombra + cuerpo + borde + texto
+        self.target_sprites = []
+        for pose_type, color in enumerate(self.pose_colors):
+            sprite = pygame.Surface((TARGET_WIDTH + 5, TARGET_HEIGHT + 5), pygame.SRCALPHA)
+            sprite.fill((*COLOR_BLACK, 80), pygame.Rect(5, 5, TARGET_WIDTH, TARGET_HEIGHT))
+            body_rect = pygame.Rect(0, 0, TARGET_WIDTH, TARGET_HEIGHT)
+            pygame.draw.rect(sprite, color, body_rect, border_radius=10)
+            pygame.draw.rect(sprite, COLOR_WHITE, body_rect, 3, border_radius=10)
+            txt = text_cache.render(self.small_font, self.pose_names[pose_type], COLOR_BLACK)
+            sprite.blit(txt, txt.get_rect(center=body_rect.center))
+            self.target_sprites.append(sprite)
+        
+        # Version sin sombra ni transparencia por pixel (calidad baja: blit mas barato)
+        self.plain_target_sprites = []
+        for pose_type, color in enumerate(self.pose_colors):
+            sprite = pygame.Surface((TARGET_WIDTH, TARGET_HEIGHT))
+            sprite.fill(COLOR_BLACK)
+            sprite.set_colorkey(COLOR_BLACK, pygame.RLEACCEL)
+            body_rect = sprite.get_rect()
+            pygame.draw.rect(sprite, color, body_rect, border_radius=10)
+            pygame.draw.rect(sprite, COLOR_WHITE, body_rect, 3, border_radius=10)
+            txt = text_cache.render(self.small_font, self.pose_names[pose_type], (1, 1, 1))
+            sprite.blit(txt, txt.get_rect(center=body_rect.center))
+            self.plain_target_sprites.append(sprite)
+
+    def set_quality(self, settings):
+        """Aplica un nivel de QUALITY_LEVELS (ver QualityGovernor)"""
+        self.inference_size = settings["inference_size"]
+        self.inference_interval = max(1, settings["inference_interval"])
+        self.full_effects = settings["effects"]
 
     def draw_ui(self, active_poses):
         """Dibuja interfaz del juego"""
         # Panel superior con estadisticas (PANEL COMPACTO Y ALTO)
-        panel_height = 80
-        panel = pygame.Surface((WINDOW_WIDTH, panel_height))
-        panel.set_alpha(200)
-        panel.fill((10, 15, 30))
-        self.screen.blit(panel, (0, 0))
+        panel_height = self.panel_height
+        self.screen.blit(self.panel_layer, (0, 0))
         
         # Linea decorativa inferior del panel
         pygame.draw.line(self.screen, COLOR_ACCENT, (0, panel_height), (WINDOW_WIDTH, panel_height), 3)
         
         # Score (Izquierda)
-        score_txt = self.font.render(f"SCORE: {self.score}", True, COLOR_WHITE)
+        score_txt = text_cache.render(self.font, f"SCORE: {self.score}", COLOR_WHITE)
         self.screen.blit(score_txt, (20, 15))
         
         # Combo (Centro)
         combo_color = COLOR_ACCENT if self.combo > 0 else COLOR_TEXT_DIM
-        combo_txt = self.font.render(f"COMBO: {self.combo}x", True, combo_color)
+        combo_txt = text_cache.render(self.font, f"COMBO: {self.combo}x", combo_color)
         combo_rect = combo_txt.get_rect(center=(WINDOW_WIDTH//2, 40))
         self.screen.blit(combo_txt, combo_rect)
         
         # Multiplicador (Derecha)
-        mult_txt = self.font.render(f"x{self.multiplier}", True, COLOR_GOLD)
+        mult_txt = text_cache.render(self.font, f"x{self.multiplier}", COLOR_GOLD)
         mult_rect = mult_txt.get_rect(right=WINDOW_WIDTH - 20, top=15)
         self.screen.blit(mult_txt, mult_rect)
         
@@ -301,75 +2044,483 @@ class LevelBody:
             color = self.pose_colors[i] if is_active else COLOR_TEXT_DIM
             
             # Fondo de la etiqueta de pose
-            pose_bg = pygame.Surface((200, 35))
-            pose_bg.set_alpha(180 if is_active else 100)
-            pose_bg.fill((20, 25, 40))
-            self.screen.blit(pose_bg, (10, pose_y_start + i * 40))
+            self.screen.blit(self.pose_bg_layers[is_active], (10, pose_y_start + i * 40))
             
             # Borde lateral si está activa
             if is_active:
                 pygame.draw.rect(self.screen, color, (10, pose_y_start + i * 40, 5, 35))
             
             # Texto de la pose
-            pose_txt = self.small_font.render(pose_name, True, color)
+            pose_txt = text_cache.render(self.small_font, pose_name, color)
             self.screen.blit(pose_txt, (20, pose_y_start + i * 40 + 5))
         
         # Zonas de activacion (Derecha, vertical)
         # Zona PERFECT
         perfect_zone = pygame.Rect(PERFECT_ZONE_X, panel_height + 20, 8, WINDOW_HEIGHT - panel_height - 40)
         pygame.draw.rect(self.screen, COLOR_GOLD, perfect_zone)
-        perfect_label = self.small_font.render("PERFECT", True, COLOR_GOLD)
-        perfect_label = pygame.transform.rotate(perfect_label, 90)
-        self.screen.blit(perfect_label, (PERFECT_ZONE_X - 30, WINDOW_HEIGHT//2 - 40))
+        self.screen.blit(self.perfect_label, (PERFECT_ZONE_X - 30, WINDOW_HEIGHT//2 - 40))
         
         # Zona GOOD
         good_zone = pygame.Rect(ACTIVATION_ZONE_X, panel_height + 20, 8, WINDOW_HEIGHT - panel_height - 40)
         pygame.draw.rect(self.screen, COLOR_ACCENT, good_zone)
-        good_label = self.small_font.render("GOOD", True, COLOR_ACCENT)
-        good_label = pygame.transform.rotate(good_label, 90)
-        self.screen.blit(good_label, (ACTIVATION_ZONE_X - 30, WINDOW_HEIGHT//2 - 20))
+        self.screen.blit(self.good_label, (ACTIVATION_ZONE_X - 30, WINDOW_HEIGHT//2 - 20))
         
-        # Dibujar objetivos
-        for target in self.targets:
-            color = self.pose_colors[target["type"]]
-            
-            # Sombra
-            shadow_rect = pygame.Rect(target["x"] + 5, target["y"] + 5, target["width"], target["height"])
-            shadow = pygame.Surface((target["width"], target["height"]))
-            shadow.set_alpha(80)
-            shadow.fill(COLOR_BLACK)
-            self.screen.blit(shadow, (shadow_rect.x, shadow_rect.y))
+        self.draw_targets()
+        self.draw_feedback()
+
+    def draw_targets(self):
+        """Dibuja los objetivos (sprite pre-renderizado por tipo) en una sola llamada"""
+        targets = self.targets
+        slots = targets.slots()
+        if len(slots) == 0:
+            return
+        sprites = self.target_sprites if self.full_effects else self.plain_target_sprites
+        self.screen.blits([(sprites[t], (x, y)) for t, x, y in zip(
+            targets.type[slots].tolist(), targets.x[slots].tolist(), targets.y[slots].tolist())],
+            doreturn=False)
+
+    def draw_feedback(self):
+        """Mensajes de feedback"""
+        feedback = self.feedback
+        slots = feedback.slots()
+        if len(slots) == 0:
+            return
+        if not self.full_effects:
+            # Sin desvanecimiento: cambiar la opacidad de cada superficie cuesta
+            self.screen.blits([(txt_surf, (x, y)) for txt_surf, x, y in zip(
+                feedback.surface[slots], feedback.x[slots].tolist(), feedback.y[slots].tolist())],
+                doreturn=False)
+            return
+        alphas = (255 * np.clip(feedback.lifetime[slots], 0, None) / FEEDBACK_LIFETIME).astype(int)
+        for txt_surf, alpha, x, y in zip(feedback.surface[slots], alphas.tolist(),
+                                         feedback.x[slots].tolist(), feedback.y[slots].tolist()):
+            # La superficie es compartida: se restaura la opacidad tras dibujar
+            txt_surf.set_alpha(alpha)
+            self.screen.blit(txt_surf, (x, y))
+            txt_surf.set_alpha(255)
+
+#CALIBRACION DE LATENCIA
+def load_latency_offset(path=CALIBRATION_PATH):
+    """Lee el offset de latencia guardado (o el valor por defecto)"""
+    try:
+        if os.path.exists(path):
+            with open(path) as f:
+                offset = float(json.load(f)["latency_offset"])
+            print(f"Offset de latencia cargado: {offset * 1000:.0f} ms")
+            return offset
+    except Exception as e:
+        print(f"Error al leer calibracion: {e}")
+    return LATENCY_OFFSET
+
+def save_latency_offset(offset, decision_latency, path=CALIBRATION_PATH):
+    try:
+        with open(path, "w") as f:
+            json.dump({"latency_offset": offset, "decision_latency": decision_latency}, f, indent=2)
+        print(f"Calibracion guardada en {path}")
+    except Exception as e:
+        print(f"Error al guardar calibracion: {e}")
+
+class LatencyCalibration(LevelBody):
+    """
+    Rutina de calibracion: el jugador levanta los brazos en cada pulso.
+    El offset es la mediana entre el pulso y el timestamp de captura del
+    primer frame con BRAZOS ARRIBA; tambien se mide la latencia
+    captura -> decision del pipeline.
+    """
+    def __init__(self, screen, model, pose_worker=None, clock=None, profiler=None):
+        super().__init__(screen, model, pose_worker, clock, profiler=profiler)
+        self.motion_gate = None     # Cada frame cuenta para ubicar el flanco de BRAZOS ARRIBA
+        self.start_time = self.clock()
+        self.beat_times = [
+            self.start_time + CALIBRATION_LEAD_IN + i * CALIBRATION_PERIOD
+            for i in range(CALIBRATION_BEATS)
+        ]
+        self.offsets = []
+        self.decision_latencies = []
+        self.matched_beats = set()
+        self.arms_up = False
+        self.arms_up_pose = get_pose_registry().index("arms_up")
+        self.result = None
+
+    def record_poses(self, pose_time, active_poses):
+        super().record_poses(pose_time, active_poses)
+        arms_up = self.arms_up_pose in active_poses
+        if arms_up and not self.arms_up:
+            self.register_edge(pose_time)
+        self.arms_up = arms_up
+
+    def register_edge(self, pose_time):
+        """Asocia el inicio de BRAZOS ARRIBA al pulso mas cercano"""
+        beat_index = min(range(len(self.beat_times)), key=lambda i: abs(self.beat_times[i] - pose_time))
+        offset = pose_time - self.beat_times[beat_index]
+        if beat_index in self.matched_beats or abs(offset) > CALIBRATION_PERIOD / 2:
+            return
+        self.matched_beats.add(beat_index)
+        self.offsets.append(offset)
+        self.decision_latencies.append(self.clock() - pose_time)
+
+    def step(self, dt):
+        # Sin objetivos: solo termina cuando pasa el ultimo pulso
+        if self.sim_time > self.beat_times[-1] + CALIBRATION_PERIOD:
+            self.finish()
+
+    def finish(self):
+        if self.finished:
+            return
+        self.finished = True
+        if len(self.offsets) < 3:
+            print("Calibracion incompleta: se mantiene el offset anterior")
+            return
+        offset = float(np.median(self.offsets))
+        decision_latency = float(np.median(self.decision_latencies))
+        self.result = offset
+        print(f"Calibracion: offset {offset * 1000:.0f} ms, "
+              f"captura->decision {decision_latency * 1000:.0f} ms ({len(self.offsets)} muestras)")
+        save_latency_offset(offset, decision_latency)
+
+    def draw_ui(self, active_poses):
+        now = self.clock()
+        center = (WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2)
+        
+        # Pulso: destello al llegar cada beat
+        since_beat = min((now - t for t in self.beat_times if now >= t), default=None)
+        flash = since_beat is not None and since_beat < 0.2
+        radius = 90 if flash else 60
+        color = COLOR_GOLD if flash else COLOR_SECONDARY
+        pygame.draw.circle(self.screen, color, center, radius)
+        pygame.draw.circle(self.screen, COLOR_WHITE, center, radius, 4)
+        
+        title = text_cache.render(self.font, "CALIBRACION DE LATENCIA", COLOR_WHITE)
+        self.screen.blit(title, title.get_rect(center=(WINDOW_WIDTH // 2, 60)))
+        hint = text_cache.render(self.small_font, "Levanta los brazos en cada destello y bajalos despues", COLOR_TEXT_DIM)
+        self.screen.blit(hint, hint.get_rect(center=(WINDOW_WIDTH // 2, 110)))
+        count = text_cache.render(self.small_font, f"Muestras: {len(self.offsets)}/{CALIBRATION_BEATS}", COLOR_ACCENT)
+        self.screen.blit(count, count.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT - 80)))
+
+#REPLAY
+class ReplayLevel(LevelBody):
+    """
+    Reproduce una sesion grabada: los keypoints salen del log en lugar de la
+    camara y YOLO, y el reloj avanza con los tiempos grabados, asi que corre
+    mas rapido que en tiempo real y da el mismo resultado en cada ejecucion.
+    """
+    def __init__(self, screen, path, draw=False, latency_offset=None):
+        self.frames, seed, self.metadata = load_session(path)
+        self.replay_index = 0
+        self.replay_now = 0.0
+        self.draw_enabled = draw
+        if latency_offset is None:
+            latency_offset = self.metadata.get("latency_offset", LATENCY_OFFSET)
+        chart = load_chart(self.metadata.get("chart"))
+        if self.metadata.get("chart") and chart is None:
+            print(f"Partitura no disponible ({self.metadata['chart']}): el replay no sera fiel")
+        super().__init__(screen, None, clock=lambda: self.replay_now,
+                         latency_offset=latency_offset, seed=seed, chart=chart,
+                         song_start=self.metadata.get("song_start"))
+
+    def acquire_keypoints(self, frame_rgb, frame_time):
+        row = self.frames[self.replay_index]
+        keypoints = []
+        if row["has_pose"]:
+            keypoints = np.concatenate([row["keypoints"], row["conf"][:, None]], axis=1)
+        return keypoints, float(row["keypoints_time"])
+
+    def run(self):
+        """Procesa todos los frames y devuelve el resultado"""
+        for i in range(len(self.frames)):
+            row = self.frames[i]
+            self.replay_index = i
+            self.replay_now = float(row["clock"])
+            frame_time = float(row["frame_time"])
+            # Cada realineacion de MusicClock quedo grabada en su frame (no en sesiones viejas)
+            if "song_start" in self.frames.dtype.names and not math.isnan(row["song_start"]):
+                self.song_start = float(row["song_start"])
+            if self.draw_enabled:
+                self.screen.fill(COLOR_BG)
+            self.update(None, None if math.isnan(frame_time) else frame_time)
+            if self.draw_enabled:
+                pygame.display.flip()
+                pygame.event.pump()
+        # Juzgar los cruces que quedaron pendientes al cortar la grabacion
+        self.flush_judgements()
+        return {"score": self.score, "hits": self.hits, "misses": self.misses,
+                "max_combo": self.max_combo}
+
+    def draw_ui(self, active_poses):
+        if self.draw_enabled:
+            super().draw_ui(active_poses)
+
+#MULTIJUGADOR
+def box_iou_matrix(a, b):
+    """IoU entre cada caja de `a` (N, 4) y cada caja de `b` (M, 4), formato x1, y1, x2, y2"""
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-6), 0.0)
+
+class PlayerTracker:
+    """
+    Asigna las personas de cada inferencia a jugadores estables (J1..Jn):
+    primero por IoU con la ultima caja del jugador y despues por cercania del
+    centro. Las personas nuevas ocupan los lugares libres de izquierda a derecha.
+    """
+    def __init__(self, num_players, iou_min=PLAYER_IOU_MIN, max_jump=PLAYER_MAX_JUMP,
+                 lost_timeout=PLAYER_LOST_TIMEOUT):
+        self.num_players = num_players
+        self.iou_min = iou_min
+        self.max_jump = max_jump
+        self.lost_timeout = lost_timeout
+        self.boxes = [None] * num_players
+        self.last_seen = [0.0] * num_players
+        self.keypoints = [[] for _ in range(num_players)]
+        self.last_time = None
+
+    def update(self, people, boxes, timestamp):
+        """Devuelve los keypoints de cada jugador ([] si no se lo ve en este resultado)"""
+        if timestamp == self.last_time:
+            return self.keypoints
+        self.last_time = timestamp
+        
+        # Liberar los lugares de jugadores perdidos hace demasiado
+        for slot in range(self.num_players):
+            if self.boxes[slot] is not None and timestamp - self.last_seen[slot] > self.lost_timeout:
+                self.boxes[slot] = None
+        
+        assignment = {}
+        tracked = [slot for slot in range(self.num_players) if self.boxes[slot] is not None]
+        if tracked and len(boxes) > 0:
+            prev = np.array([self.boxes[slot] for slot in tracked], dtype=np.float32)
             
-            # Target principal
-            target_rect = pygame.Rect(target["x"], target["y"], target["width"], target["height"])
-            pygame.draw.rect(self.screen, color, target_rect, border_radius=10)
-            pygame.draw.rect(self.screen, COLOR_WHITE, target_rect, 3, border_radius=10)
+            # 1. Pares con mayor IoU primero
+            iou = box_iou_matrix(prev, boxes)
+            for flat in np.argsort(iou, axis=None)[::-1]:
+                i, j = np.unravel_index(flat, iou.shape)
+                if iou[i, j] < self.iou_min:
+                    break
+                if tracked[i] not in assignment and j not in assignment.values():
+                    assignment[tracked[i]] = j
             
-            # Texto del target
-            txt = self.small_font.render(self.pose_names[target["type"]], True, COLOR_BLACK)
-            txt_rect = txt.get_rect(center=target_rect.center)
-            self.screen.blit(txt, txt_rect)
-        
-        # Mensajes de feedback
-        for msg in self.feedback_messages:
-            alpha = int(255 * (msg["lifetime"] / 30))
-            feedback_font = pygame.font.SysFont("Arial", msg["size"], bold=True)
-            txt_surf = feedback_font.render(msg["text"], True, msg["color"])
-            txt_surf.set_alpha(alpha)
-            self.screen.blit(txt_surf, (msg["x"], msg["y"]))
+            # 2. Movimientos bruscos: centro mas cercano dentro de PLAYER_MAX_JUMP
+            prev_centers = (prev[:, :2] + prev[:, 2:]) / 2
+            centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+            dist = np.linalg.norm(prev_centers[:, None] - centers[None, :], axis=2)
+            for flat in np.argsort(dist, axis=None):
+                i, j = np.unravel_index(flat, dist.shape)
+                if dist[i, j] > self.max_jump:
+                    break
+                if tracked[i] not in assignment and j not in assignment.values():
+                    assignment[tracked[i]] = j
+        
+        # 3. Personas nuevas a los lugares libres, de izquierda a derecha
+        free_slots = [slot for slot in range(self.num_players)
+                      if self.boxes[slot] is None and slot not in assignment]
+        new_people = [j for j in range(len(boxes)) if j not in assignment.values()]
+        new_people.sort(key=lambda j: boxes[j][0] + boxes[j][2])
+        for slot, j in zip(free_slots, new_people):
+            assignment[slot] = j
+        
+        self.keypoints = [[] for _ in range(self.num_players)]
+        for slot, j in assignment.items():
+            self.boxes[slot] = boxes[j].copy()
+            self.last_seen[slot] = timestamp
+            self.keypoints[slot] = people[j]
+        return self.keypoints
+
+class PlayerLane(LevelBody):
+    """
+    Carril de un jugador: mismo juego que LevelBody (puntaje, combo y
+    multiplicador propios) limitado a una franja horizontal de la pantalla.
+    Los keypoints los entrega MultiplayerLevel en lugar de YOLO.
+    """
+    def __init__(self, screen, player_index, lane_rect, **kwargs):
+        self.player_index = player_index
+        self.lane_rect = lane_rect
+        self.color = PLAYER_COLORS[player_index % len(PLAYER_COLORS)]
+        self.assigned_keypoints = []
+        self.assigned_time = 0.0
+        super().__init__(screen, None, **kwargs)
+        self.motion_gate = None     # Lo decide MultiplayerLevel para todos los carriles
+        self.spawn_y_range = (lane_rect.top + 35, lane_rect.bottom - TARGET_HEIGHT - 5)
+
+    def acquire_keypoints(self, frame_rgb, frame_time):
+        return self.assigned_keypoints, self.assigned_time
+
+    def build_static_layers(self):
+        super().build_static_layers()
+        self.lane_layer = pygame.Surface((WINDOW_WIDTH, 30))
+        self.lane_layer.set_alpha(170)
+        self.lane_layer.fill((10, 15, 30))
+
+    def draw_ui(self, active_poses):
+        """HUD compacto del carril: puntaje, zonas, objetivos y feedback"""
+        lane = self.lane_rect
+        self.screen.blit(self.lane_layer, lane.topleft)
+        pygame.draw.line(self.screen, self.color, lane.bottomleft, lane.bottomright, 2)
+        
+        hud = f"J{self.player_index + 1}   {self.score}   x{self.multiplier}   COMBO {self.combo}"
+        hud_txt = text_cache.render(self.small_font, hud, self.color)
+        self.screen.blit(hud_txt, (lane.left + 140, lane.top + 3))
+        
+        # Poses activas como indicadores pequenos a la derecha
+        indicators_x = lane.right - 10 - 24 * len(self.pose_colors)
+        for i, pose_color in enumerate(self.pose_colors):
+            color = pose_color if i in active_poses else COLOR_TEXT_DIM
+            pygame.draw.rect(self.screen, color, (indicators_x + i * 24, lane.top + 8, 16, 16),
+                             border_radius=4)
+        
+        zone_top = lane.top + 32
+        zone_height = lane.height - 36
+        pygame.draw.rect(self.screen, COLOR_GOLD, (PERFECT_ZONE_X, zone_top, 6, zone_height))
+        pygame.draw.rect(self.screen, COLOR_ACCENT, (ACTIVATION_ZONE_X, zone_top, 6, zone_height))
+        
+        self.draw_targets()
+        self.draw_feedback()
+
+class MultiplayerLevel:
+    """
+    Partida de 2 a 4 jugadores con una sola inferencia por frame: todas las
+    personas detectadas se asignan a jugadores estables y cada uno juega en
+    su propio carril.
+    """
+    def __init__(self, screen, model, num_players, pose_worker=None, clock=None,
+                 latency_offset=LATENCY_OFFSET, profiler=None, chart=None):
+        self.screen = screen
+        self.model = model
+        self.pose_worker = pose_worker
+        self.profiler = profiler or FrameProfiler(enabled=False)
+        self.clock = clock or time.monotonic
+        self.frame_now = 0.0
+        self.finished = False
+        
+        self.inference_size = INFERENCE_SIZE
+        self.inference_interval = max(1, INFERENCE_EVERY_N_FRAMES)
+        self.roi = RoiTracker() if ROI_CROPPING else None   # Solo sin pose_worker (el worker tiene la suya)
+        self.motion_gate = MotionGate() if MOTION_GATING else None
+        self.frame_count = 0
+        self.last_result_id = 0
+        self.last_people = np.zeros((0, 17, 3), dtype=np.float32)
+        self.last_boxes = np.zeros((0, 4), dtype=np.float32)
+        self.last_people_time = 0.0
+        
+        num_players = max(2, min(num_players, MAX_PLAYERS))
+        self.players = PlayerTracker(num_players)
+        
+        # Carriles horizontales (la franja inferior queda para el boton de salida);
+        # misma semilla en todos: cada jugador recibe la misma secuencia de poses
+        seed = random.randrange(2**32)
+        lane_height = (WINDOW_HEIGHT - 60) // num_players
+        self.lanes = [
+            PlayerLane(screen, i, pygame.Rect(0, i * lane_height, WINDOW_WIDTH, lane_height),
+                       clock=lambda: self.frame_now, latency_offset=latency_offset,
+                       profiler=self.profiler, seed=seed, chart=chart)
+            for i in range(num_players)
+        ]
+        self.tag_font = text_cache.get_font(28, bold=True)
+
+    def update(self, frame_rgb, frame_time=None):
+        self.frame_now = self.clock()
+        
+        # 1. Una inferencia para todos los jugadores
+        people, boxes, people_time = self.acquire_people(frame_rgb, frame_time)
+        self.profiler.lap("inferencia")
+        
+        # 2. Identidad estable de cada persona
+        assigned = self.players.update(people, boxes, people_time)
+        self.profiler.lap("seguimiento")
+        
+        # 3. Cada carril sigue el pipeline normal de LevelBody
+        for lane, keypoints in zip(self.lanes, assigned):
+            lane.assigned_keypoints = keypoints
+            lane.assigned_time = people_time
+            lane.update(frame_rgb, frame_time)
+        self.finished = all(lane.finished for lane in self.lanes)
+        
+        self.draw_player_tags()
+        self.profiler.lap("dibujo")
+
+    def acquire_people(self, frame_rgb, frame_time):
+        """Devuelve (keypoints (P, 17, 3), cajas (P, 4), timestamp) para este frame"""
+        run_inference = self.frame_count % self.inference_interval == 0
+        self.frame_count += 1
+        if run_inference and self.motion_gate:
+            timestamp = frame_time if frame_time is not None else self.frame_now
+            force = any(lane.targets_near_zone() for lane in self.lanes)
+            if not self.motion_gate.should_infer(frame_rgb, timestamp, force):
+                return self.reuse_people(timestamp)
+        if self.pose_worker:
+            if run_inference:
+                self.pose_worker.submit(frame_rgb, frame_time)
+            people, boxes, people_time = self.pose_worker.get_latest_people()
+            if self.pose_worker.result_id != self.last_result_id:
+                self.last_result_id = self.pose_worker.result_id
+                self.profiler.event("inferencia")
+            return people, boxes, people_time
+        if run_inference:
+            self.last_people, self.last_boxes = run_pose_inference_all(
+                self.model, frame_rgb, self.inference_size, self.roi)
+            self.last_people_time = frame_time if frame_time is not None else self.frame_now
+            self.profiler.event("inferencia")
+        return self.last_people, self.last_boxes, self.last_people_time
+
+    def reuse_people(self, frame_time):
+        """Escena quieta: las personas del frame de referencia con el timestamp de este frame"""
+        if self.pose_worker:
+            people, boxes, people_time = self.pose_worker.get_latest_people()
+            if people_time == self.motion_gate.reference_time:
+                people_time = frame_time
+            return people, boxes, people_time
+        self.last_people_time = frame_time
+        return self.last_people, self.last_boxes, frame_time
+
+    def set_quality(self, settings):
+        """Aplica un nivel de QUALITY_LEVELS a la inferencia compartida y a cada carril"""
+        self.inference_size = settings["inference_size"]
+        self.inference_interval = max(1, settings["inference_interval"])
+        for lane in self.lanes:
+            lane.set_quality(settings)
+
+    def draw_player_tags(self):
+        """Etiqueta J1..Jn sobre la caja de cada jugador visible"""
+        for slot, box in enumerate(self.players.boxes):
+            if box is None or len(self.players.keypoints[slot]) == 0:
+                continue
+            color = self.lanes[slot].color
+            tag = text_cache.render(self.tag_font, f"J{slot + 1}", color)
+            x1, y1, x2, y2 = (int(v) for v in box)
+            pygame.draw.rect(self.screen, color, (x1, y1, x2 - x1, y2 - y1), 2, border_radius=6)
+            self.screen.blit(tag, tag.get_rect(midbottom=((x1 + x2) // 2, max(y1 - 4, 30))))
 
 #MENU PRINCIPAL 
 class MainMenu:
     def __init__(self, screen):
         self.screen = screen
-        self.title_font = pygame.font.SysFont("Arial", 80, bold=True)
-        self.subtitle_font = pygame.font.SysFont("Arial", 28)
-        self.btn_font = pygame.font.SysFont("Arial", 32, bold=True)
-        self.info_font = pygame.font.SysFont("Arial", 20)
+        self.title_font = text_cache.get_font(80, bold=True)
+        self.subtitle_font = text_cache.get_font(28)
+        self.btn_font = text_cache.get_font(32, bold=True)
+        self.info_font = text_cache.get_font(20)
         
         # Animaciones
         self.time = 0
         self.particles = []
+        self.footer_text = "Presiona un boton para comenzar  |  2-4: multijugador  |  C: calibrar latencia"
+        
+        # Modo dirty rects
+        self.static_layer = None
+        self.foreground_rects = []
+        self.button_areas = []
+        self.footer_area = None
+        self.needs_full_redraw = True
+        
+        # Indicador de carga (entre el titulo y los botones)
+        self.loading_status = None
+        self.loading_error = False
+        self.disabled_actions = set()
+        self.loading_area = pygame.Rect(WINDOW_WIDTH // 2 - 400, 240, 800, 50)
         
         btn_width = 300
         btn_height = 70
@@ -410,55 +2561,65 @@ class MainMenu:
                 "size": random.randint(1, 3)
             })
 
+    def update_particles(self):
+        for p in self.particles:
+            p["y"] += p["speed"]
+            if p["y"] > WINDOW_HEIGHT:
+                p["y"] = 0
+                p["x"] = random.randint(0, WINDOW_WIDTH)
+
     def draw_animated_background(self):
         """Fondo animado con particulas"""
         self.screen.fill(COLOR_BG)
         
         # Actualizar y dibujar particulas
+        self.update_particles()
         for p in self.particles:
-            p["y"] += p["speed"]
-            if p["y"] > WINDOW_HEIGHT:
-                p["y"] = 0
-                p["x"] = random.randint(0, WINDOW_WIDTH)
-            
             alpha = int(150 + 105 * math.sin(self.time * 0.02 + p["x"]))
             color = (*COLOR_ACCENT, alpha)
             pygame.draw.circle(self.screen, COLOR_ACCENT, (int(p["x"]), int(p["y"])), p["size"])
 
-    def draw_title_section(self):
-        """Dibuja el titulo con efectos (SIN superposicion)"""
+    def draw_title_section(self, surface=None):
+        """Dibuja el titulo con efectos (SIN superposicion). Devuelve las zonas ocupadas"""
+        if surface is None:
+            surface = self.screen
         # Titulo principal con efecto de brillo
         title_text = "NEURO RHYTHM"
         
         # Sombra del titulo
-        shadow_surf = self.title_font.render(title_text, True, COLOR_BLACK)
+        shadow_surf = text_cache.render(self.title_font, title_text, COLOR_BLACK)
         shadow_rect = shadow_surf.get_rect(center=(WINDOW_WIDTH//2 + 4, 120))
-        self.screen.blit(shadow_surf, shadow_rect)
+        surface.blit(shadow_surf, shadow_rect)
         
         # Titulo con gradiente (simulado con capas)
-        title_surf = self.title_font.render(title_text, True, COLOR_ACCENT)
+        title_surf = text_cache.render(self.title_font, title_text, COLOR_ACCENT)
         title_rect = title_surf.get_rect(center=(WINDOW_WIDTH//2, 116))
-        self.screen.blit(title_surf, title_rect)
+        surface.blit(title_surf, title_rect)
         
         # Subtitulo
         subtitle_text = "Sistema de Deteccion de Movimiento"
-        subtitle_surf = self.subtitle_font.render(subtitle_text, True, COLOR_TEXT_DIM)
+        subtitle_surf = text_cache.render(self.subtitle_font, subtitle_text, COLOR_TEXT_DIM)
         subtitle_rect = subtitle_surf.get_rect(center=(WINDOW_WIDTH//2, 180))
-        self.screen.blit(subtitle_surf, subtitle_rect)
+        surface.blit(subtitle_surf, subtitle_rect)
         
         # Linea decorativa
         line_width = 400
         line_y = 210
         pygame.draw.line(
-            self.screen,
+            surface,
             COLOR_SECONDARY,
             (WINDOW_WIDTH//2 - line_width//2, line_y),
             (WINDOW_WIDTH//2 + line_width//2, line_y),
             3
         )
+        
+        line_rect = pygame.Rect(WINDOW_WIDTH//2 - line_width//2, line_y - 1, line_width + 1, 3)
+        return [shadow_rect.union(title_rect), subtitle_rect, line_rect]
 
-    def draw_feature_cards(self):
-        """Cards con caracteristicas (REPOSICIONADAS debajo de botones)"""
+    def draw_feature_cards(self, surface=None):
+        """Cards con caracteristicas (REPOSICIONADAS debajo de botones). Devuelve sus zonas"""
+        if surface is None:
+            surface = self.screen
         features = [
             "Deteccion en Tiempo Real",
             "Sistema de Combos",
@@ -471,6 +2632,7 @@ class MainMenu:
         spacing = 40
         total_width = (card_width * 3) + (spacing * 2)
         start_x = (WINDOW_WIDTH - total_width) // 2
+        card_areas = []
         
         for i, feature in enumerate(features):
             x = start_x + (card_width + spacing) * i
@@ -479,16 +2641,19 @@ class MainMenu:
             
             # Sombra
             shadow_rect = pygame.Rect(x + 4, start_y + 4, card_width, card_height)
-            pygame.draw.rect(self.screen, (0, 0, 0, 100), shadow_rect, border_radius=10)
+            pygame.draw.rect(surface, COLOR_BLACK, shadow_rect, border_radius=10)
             
             # Card principal
-            pygame.draw.rect(self.screen, (30, 41, 59), card_rect, border_radius=10)
-            pygame.draw.rect(self.screen, (67, 97, 238), card_rect, 2, border_radius=10)
+            pygame.draw.rect(surface, (30, 41, 59), card_rect, border_radius=10)
+            pygame.draw.rect(surface, (67, 97, 238), card_rect, 2, border_radius=10)
             
             # Texto
-            feature_surf = self.info_font.render(feature, True, COLOR_WHITE)
+            feature_surf = text_cache.render(self.info_font, feature, COLOR_WHITE)
             feature_rect = feature_surf.get_rect(center=card_rect.center)
-            self.screen.blit(feature_surf, feature_rect)
+            surface.blit(feature_surf, feature_rect)
+            card_areas.append(card_rect.union(shadow_rect))
+        
+        return card_areas
 
     def draw_buttons(self):
         """Dibuja botones interactivos mejorados"""
@@ -496,7 +2661,8 @@ class MainMenu:
         
         for i, btn in enumerate(self.buttons):
             rect = btn["rect"]
-            hover = rect.collidepoint(mouse_pos)
+            disabled = btn["action"] in self.disabled_actions
+            hover = rect.collidepoint(mouse_pos) and not disabled
             
             # Efecto de elevacion en hover
             if hover:
@@ -527,6 +2693,10 @@ class MainMenu:
                 # Efecto de brillo pulsante
                 glow = int(20 * (1 + math.sin(self.time * 0.15)))
                 bg_color = tuple(min(255, c + glow) for c in bg_color)
+            elif disabled:
+                bg_color = (30, 41, 59)
+                border_color = COLOR_TEXT_DIM
+                text_color = COLOR_TEXT_DIM
             else:
                 bg_color = (30, 41, 59)
                 border_color = btn["color"]
@@ -543,7 +2713,7 @@ class MainMenu:
                 pygame.draw.rect(self.screen, text_color, bar_rect, border_radius=3)
             
             # Texto del boton
-            txt_surf = self.btn_font.render(btn["text"], True, text_color)
+            txt_surf = text_cache.render(self.btn_font, btn["text"], text_color)
             txt_rect = txt_surf.get_rect(center=display_rect.center)
             self.screen.blit(txt_surf, txt_rect)
             
@@ -561,9 +2731,15 @@ class MainMenu:
                 pygame.draw.polygon(self.screen, text_color, points)
 
     def draw(self):
-        """Dibuja el menu completo"""
+        """
+        Dibuja el menu completo. En modo dirty rects devuelve la lista de
+        zonas modificadas (None = actualizar la ventana entera).
+        """
         self.time += 1
         
+        if DIRTY_RECT_MENU:
+            return self.draw_dirty()
+        
         # 1. Fondo animado
         self.draw_animated_background()
         
@@ -572,23 +2748,181 @@ class MainMenu:
         
         # 3. Botones principales
         self.draw_buttons()
+        self.draw_loading_indicator()
         
         # 4. Cards de caracteristicas
         self.draw_feature_cards()
         
         # 5. Footer con creditos
-        footer_text = "Presiona un boton para comenzar"
-        footer_surf = self.info_font.render(footer_text, True, COLOR_TEXT_DIM)
+        self.draw_footer()
+        return None
+
+    def draw_footer(self):
+        footer_surf = text_cache.render(self.info_font, self.footer_text, COLOR_TEXT_DIM)
         alpha = int(200 + 55 * math.sin(self.time * 0.05))
         footer_surf.set_alpha(alpha)
-        self.screen.blit(footer_surf, (WINDOW_WIDTH//2 - footer_surf.get_width()//2, WINDOW_HEIGHT - 30))
+        footer_rect = footer_surf.get_rect(topleft=(WINDOW_WIDTH//2 - footer_surf.get_width()//2, WINDOW_HEIGHT - 30))
+        self.screen.blit(footer_surf, footer_rect)
+        footer_surf.set_alpha(255)
+        return footer_rect
+
+    def set_loading(self, status, error=False):
+        """Texto de carga en curso (None = listo); mientras carga, NIVEL 1 queda deshabilitado"""
+        self.loading_status = status
+        self.loading_error = error
+        self.disabled_actions = {"lvl1"} if status is not None else set()
+
+    def draw_loading_indicator(self):
+        """Spinner y estado de la carga en segundo plano. Devuelve su zona (o None)"""
+        if self.loading_status is None:
+            return None
+        center_y = self.loading_area.centery
+        color = COLOR_DANGER if self.loading_error else COLOR_SECONDARY
+        text = self.loading_status or "Cargando..."
+        if len(text) > 90:
+            text = text[:87] + "..."
+        text_surf = text_cache.render(self.info_font, text, COLOR_DANGER if self.loading_error else COLOR_TEXT_DIM)
+        text_rect = text_surf.get_rect(midleft=(0, center_y))
+        
+        # Spinner a la izquierda del texto, el conjunto centrado
+        spinner_radius = 10
+        total_width = spinner_radius * 2 + 15 + text_rect.width
+        left = WINDOW_WIDTH // 2 - total_width // 2
+        spinner_center = (left + spinner_radius, center_y)
+        text_rect.left = left + spinner_radius * 2 + 15
+        
+        if not self.loading_error:
+            head = int(self.time * 0.25) % 8
+            for i in range(8):
+                angle = i * math.pi / 4
+                fade = (i - head) % 8
+                dot_color = tuple(int(c * (1 - fade / 10)) for c in color)
+                pos = (int(spinner_center[0] + spinner_radius * math.cos(angle)),
+                       int(spinner_center[1] + spinner_radius * math.sin(angle)))
+                pygame.draw.circle(self.screen, dot_color, pos, 3 if fade == 0 else 2)
+        self.screen.blit(text_surf, text_rect)
+        return self.loading_area
+
+    def invalidate(self):
+        """Fuerza un redibujado completo (p. ej. al volver del juego)"""
+        self.needs_full_redraw = True
+
+    def build_static_layer(self):
+        """Fondo, titulo y cards compuestos una sola vez para el modo dirty rects"""
+        self.static_layer = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT))
+        self.static_layer.fill(COLOR_BG)
+        self.foreground_rects = self.draw_title_section(self.static_layer)
+        self.foreground_rects += self.draw_feature_cards(self.static_layer)
+        # Margen para sombra, escala animada y borde de los botones
+        self.button_areas = [btn["rect"].inflate(24, 24) for btn in self.buttons]
+
+    def _particle_rect(self, p):
+        size = p["size"]
+        return pygame.Rect(int(p["x"]) - size, int(p["y"]) - size, size * 2 + 1, size * 2 + 1)
+
+    def draw_dirty(self):
+        """Redibuja solo particulas, botones y footer sobre la capa estatica"""
+        if self.static_layer is None:
+            self.build_static_layer()
+        
+        full_redraw = self.needs_full_redraw
+        self.needs_full_redraw = False
+        dirty = []
+        
+        if full_redraw:
+            self.screen.blit(self.static_layer, (0, 0))
+        
+        # Borrar zonas animadas restaurando la capa estatica
+        restore = list(self.button_areas) + [self.loading_area]
+        if self.footer_area:
+            restore.append(self.footer_area)
+        for p in self.particles:
+            restore.append(self._particle_rect(p))
+        for area in restore:
+            self.screen.blit(self.static_layer, area, area)
+        dirty.extend(restore)
+        
+        # Particulas (quedan ocultas detras del titulo y las cards)
+        self.update_particles()
+        for p in self.particles:
+            rect = self._particle_rect(p)
+            dirty.append(rect)
+            if rect.collidelist(self.foreground_rects) != -1:
+                continue
+            pygame.draw.circle(self.screen, COLOR_ACCENT, (int(p["x"]), int(p["y"])), p["size"])
+        
+        self.draw_buttons()
+        self.draw_loading_indicator()
+        self.footer_area = self.draw_footer()
+        dirty.append(self.footer_area)
+        
+        return None if full_redraw else dirty
 
     def check_click(self, pos):
         for btn in self.buttons:
-            if btn["rect"].collidepoint(pos):
+            if btn["rect"].collidepoint(pos) and btn["action"] not in self.disabled_actions:
                 return btn["action"]
         return None
 
+#CARGA EN SEGUNDO PLANO
+class StartupLoader:
+    """
+    Carga pesada (modelo, camara, partitura) en hilos mientras el menu ya se
+    anima. Cada cadena es una lista de etapas (nombre, texto, funcion) que se
+    ejecutan en orden en su propio hilo; las cadenas corren en paralelo.
+    """
+    def __init__(self, chains):
+        self.chains = chains
+        self.lock = threading.Lock()
+        self.running = {}       # cadena -> texto de la etapa en curso
+        self.timings = {}       # etapa -> (inicio desde STARTUP_TIME, duracion) en s
+        self.error = None
+        self.done = False
+        self.ready = False
+        self.threads = []
+
+    def start(self):
+        for index, chain in enumerate(self.chains):
+            thread = threading.Thread(target=self._run_chain, args=(index, chain), daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def _run_chain(self, index, chain):
+        for name, text, fn in chain:
+            with self.lock:
+                if self.error:
+                    break
+                self.running[index] = text
+            start = time.perf_counter()
+            try:
+                fn()
+            except Exception as e:
+                with self.lock:
+                    self.error = f"Error al inicializar ({name}): {e}"
+                print(f"Error critico al inicializar ({name}): {e}")
+                break
+            finally:
+                with self.lock:
+                    self.timings[name] = (start - STARTUP_TIME, time.perf_counter() - start)
+        with self.lock:
+            self.running.pop(index, None)
+
+    def poll(self):
+        """True la primera vez que todas las cadenas terminaron"""
+        if self.done or any(thread.is_alive() for thread in self.threads):
+            return False
+        self.done = True
+        self.ready = self.error is None
+        return True
+
+    def status(self):
+        """Texto para el indicador de carga"""
+        with self.lock:
+            if self.error:
+                return self.error
+            return "  |  ".join(self.running[i] for i in sorted(self.running))
+
 #GESTOR PRINCIPAL
 class GameManager:
     def __init__(self):
@@ -596,6 +2930,8 @@ class GameManager:
         self.screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
         pygame.display.set_caption("NEURO RHYTHM - Proyecto Final")
         self.clock = pygame.time.Clock()
+        self.startup_marks = {"importaciones": IMPORT_TIME,
+                              "ventana": time.perf_counter() - STARTUP_TIME}
         
         print("\n" + "="*50)
         print("NEURO RHYTHM - Sistema Iniciando...")
@@ -606,24 +2942,59 @@ class GameManager:
         self.music_loaded = False
         self.load_music()
         
-        try:
-            print("Cargando Modelo YOLO...")
-            self.yolo_model = YOLO("yolov8n-pose.pt")
-            print("Modelo YOLO cargado")
-            
-            print("Iniciando Camara...")
-            self.cam = CameraEngine()
-            
-            print("Sistema listo para jugar")
-            print("="*50 + "\n")
-            
-        except Exception as e:
-            print(f"Error critico al inicializar: {e}")
-            sys.exit(1)
+        self.latency_offset = load_latency_offset()
+        self.profiler = FrameProfiler()
+        self.governor = QualityGovernor() if QUALITY_GOVERNOR else None
         
         self.state = "MENU"
         self.menu = MainMenu(self.screen)
         self.level = None
+        
+        # Modelo, camara y partitura se cargan mientras el menu se anima
+        self.yolo_model = None
+        self.cam = None
+        self.pose_worker = None
+        self.chart_path = None
+        self.pipeline = None
+        if MULTIPROCESS_PIPELINE:
+            media_chains = [[("pipeline", "Iniciando procesos de captura e inferencia...",
+                              self.start_pipeline)]]
+        else:
+            media_chains = [
+                [("modelo", "Cargando modelo YOLO...", self.load_model),
+                 ("calentamiento", "Calentando modelo...", self.warmup_model),
+                 ("worker", "Iniciando inferencia...", self.start_pose_worker)],
+                [("camara", "Iniciando camara...", self.start_camera)]
+            ]
+        self.loader = StartupLoader(media_chains + [
+            [("partitura", "Preparando partitura...", self.prepare_chart)]
+        ]).start()
+        self.menu.set_loading(self.loader.status())
+
+    def load_model(self):
+        self.yolo_model = PoseBackend(INFERENCE_BACKEND)
+        print(f"Modelo YOLO cargado (backend: {self.yolo_model.backend})")
+
+    def warmup_model(self):
+        self.yolo_model.warmup()
+
+    def start_pose_worker(self):
+        if ASYNC_INFERENCE:
+            self.pose_worker = PoseWorker(self.yolo_model)
+            self.pose_worker.start()
+
+    def start_camera(self):
+        self.cam = CameraEngine()
+
+    def start_pipeline(self):
+        """Captura e inferencia en procesos propios; este proceso solo dibuja"""
+        from pipeline import SharedPipeline
+        self.pipeline = SharedPipeline((WINDOW_HEIGHT, WINDOW_WIDTH, 3), PIPELINE_RING_SLOTS,
+                                       PIPELINE_MAX_PEOPLE, CAMERA_ID, INFERENCE_BACKEND,
+                                       INFERENCE_SIZE, ROI_CROPPING)
+        self.pipeline.start()
+        self.cam = self.pipeline.camera
+        self.pose_worker = self.pipeline.pose_worker
 
     def load_music(self):
         """Carga y reproduce la musica de fondo"""
@@ -641,16 +3012,90 @@ class GameManager:
             print(f"Error al cargar musica: {e}")
             print("El juego continuara sin musica de fondo.")
 
+    def prepare_chart(self):
+        """Ruta de la partitura del tema: la propia o la generada de sus pulsos (en cache)"""
+        if os.path.exists(CHART_PATH):
+            self.chart_path = CHART_PATH
+            return
+        if not (AUTO_CHART and self.music_loaded):
+            return
+        try:
+            from beatmap import ensure_chart
+            self.chart_path = ensure_chart(MUSIC_PATH, get_pose_registry().keys, CHART_LANES,
+                                           CHART_MIN_NOTE_GAP, cache_dir=CHART_CACHE_DIR)
+        except Exception as e:
+            print(f"Error al generar partitura: {e}")
+            print("Se usaran objetivos aleatorios.")
+
+    def check_startup(self):
+        """Actualiza el indicador de carga y, al terminar, emite el reporte de arranque"""
+        if self.loader.done:
+            return
+        if not self.loader.poll():
+            self.menu.set_loading(self.loader.status())
+            return
+        if self.loader.ready:
+            self.menu.set_loading(None)
+            print("Sistema listo para jugar")
+            print("="*50 + "\n")
+        else:
+            self.menu.set_loading(self.loader.status(), error=True)
+        self.startup_marks["listo"] = time.perf_counter() - STARTUP_TIME
+        self.report_startup()
+
+    def report_startup(self):
+        """Tiempos de arranque en consola y, si STARTUP_LOG_PATH, una linea JSON por inicio"""
+        marks = self.startup_marks
+        print("Reporte de arranque (s desde el inicio del proceso):")
+        for name in ("importaciones", "ventana", "primer_frame_menu"):
+            if name in marks:
+                print(f"  {name:<20} {marks[name]:6.2f}")
+        for name, (start, duration) in sorted(self.loader.timings.items(), key=lambda item: item[1][0]):
+            print(f"  {name:<20} {start:6.2f} -> {start + duration:6.2f}  ({duration:.2f} s)")
+        print(f"  {'listo' if self.loader.ready else 'error':<20} {marks['listo']:6.2f}")
+        
+        if not STARTUP_LOG_PATH:
+            return
+        try:
+            entry = {
+                "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "ready": self.loader.ready,
+                "marks": {name: round(value, 4) for name, value in marks.items()},
+                "stages": {name: {"start": round(start, 4), "duration": round(duration, 4)}
+                           for name, (start, duration) in self.loader.timings.items()}
+            }
+            with open(STARTUP_LOG_PATH, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+        except Exception as e:
+            print(f"Error al guardar tiempos de arranque: {e}")
+
+    def start_chart(self):
+        """Carga la partitura del tema y lo reinicia para que las notas caigan en el pulso"""
+        chart = load_chart(self.chart_path)
+        if chart is not None and self.music_loaded:
+            pygame.mixer.music.play(-1)
+        return chart
+
     def run(self):
         running = True
         
         try:
             while running:
+                frame_start = time.perf_counter()
+                self.profiler.begin_frame()
                 events = pygame.event.get()
+                dirty_rects = None
+                
+                for event in events:
+                    if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                        self.profiler.toggle_overlay()
+                        self.menu.invalidate()
                 
                 # ESTADO: MENU
                 if self.state == "MENU":
-                    self.menu.draw()
+                    self.check_startup()
+                    dirty_rects = self.menu.draw()
+                    self.profiler.lap("menu")
                     
                     for event in events:
                         if event.type == pygame.QUIT:
@@ -660,9 +3105,26 @@ class GameManager:
                             if action == "quit":
                                 running = False
                             elif action == "lvl1":
-                                self.state = "GAME"
-                                self.level = LevelBody(self.screen, self.yolo_model)
+                                self.begin_level(LevelBody(self.screen, self.yolo_model, self.pose_worker,
+                                                           latency_offset=self.latency_offset,
+                                                           profiler=self.profiler,
+                                                           record=RECORD_SESSIONS,
+                                                           chart=self.start_chart()))
                                 print("Iniciando Nivel 1: RITMO")
+                        if not self.loader.ready:
+                            continue
+                        if event.type == pygame.KEYDOWN and event.key == pygame.K_c:
+                            self.begin_level(LatencyCalibration(self.screen, self.yolo_model, self.pose_worker,
+                                                                profiler=self.profiler))
+                            print("Iniciando calibracion de latencia")
+                        if event.type == pygame.KEYDOWN and event.key in MULTIPLAYER_KEYS:
+                            num_players = MULTIPLAYER_KEYS[event.key]
+                            self.begin_level(MultiplayerLevel(self.screen, self.yolo_model, num_players,
+                                                              self.pose_worker,
+                                                              latency_offset=self.latency_offset,
+                                                              profiler=self.profiler,
+                                                              chart=self.start_chart()))
+                            print(f"Iniciando Nivel 1: RITMO ({num_players} jugadores)")
 
                 # ESTADO: JUEGO
                 elif self.state == "GAME":
@@ -670,28 +3132,44 @@ class GameManager:
                     frame_surf = self.cam.get_frame()
                     if frame_surf:
                         self.screen.blit(frame_surf, (0, 0))
+                    self.profiler.lap("captura")
                     
                     # Actualizar Nivel
                     if self.level and self.cam.last_frame_rgb is not None:
-                        self.level.update(self.cam.last_frame_rgb)
+                        self.level.update(self.cam.last_frame_rgb, self.cam.last_frame_time)
+                        if self.level.finished:
+                            self.end_level()
                     
                     # Boton Volver
                     back_rect = pygame.Rect(10, WINDOW_HEIGHT - 50, 120, 40)
                     pygame.draw.rect(self.screen, COLOR_DANGER, back_rect, border_radius=8)
-                    back_txt = pygame.font.SysFont("Arial", 20).render("SALIR (ESC)", True, COLOR_WHITE)
+                    back_txt = text_cache.render(text_cache.get_font(20), "SALIR (ESC)", COLOR_WHITE)
                     self.screen.blit(back_txt, (20, WINDOW_HEIGHT - 40))
 
                     # Eventos del Juego
                     for event in events:
                         if event.type == pygame.QUIT:
                             running = False
-                        if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
-                            print(f"Partida terminada - Score: {self.level.score}, Max Combo: {self.level.max_combo}")
-                            self.state = "MENU"
-                            self.level = None
+                        if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE and self.level:
+                            self.end_level()
 
-                pygame.display.flip()
-                self.clock.tick(30)
+                overlay_rect = self.profiler.draw_overlay(self.screen)
+                if overlay_rect and dirty_rects is not None:
+                    dirty_rects.append(overlay_rect)
+                self.profiler.lap("ui")
+
+                if dirty_rects is not None:
+                    pygame.display.update(dirty_rects)
+                else:
+                    pygame.display.flip()
+                self.profiler.lap("presentacion")
+                if self.state == "GAME" and self.governor:
+                    self.update_governor(time.perf_counter() - frame_start)
+                if "primer_frame_menu" not in self.startup_marks:
+                    self.startup_marks["primer_frame_menu"] = time.perf_counter() - STARTUP_TIME
+                self.clock.tick(TARGET_FPS)
+                self.profiler.lap("espera")
+                self.profiler.end_frame()
                 
         except KeyboardInterrupt:
             print("\nInterrupcion por teclado detectada")
@@ -700,6 +3178,49 @@ class GameManager:
         finally:
             self.cleanup()
 
+    def begin_level(self, level):
+        """Pasa al estado de juego con `level` y el nivel de calidad vigente"""
+        self.state = "GAME"
+        self.level = level
+        if self.governor:
+            self.apply_quality()
+
+    def update_governor(self, work_time):
+        """Alimenta al gobernador con el trabajo del frame del hilo principal"""
+        # Con inferencia asincrona su latencia no frena el render, y bajar la calidad
+        # o espaciar las inferencias no descarga al worker: solo cuenta el frame
+        if self.governor.update(work_time):
+            self.apply_quality()
+
+    def apply_quality(self):
+        settings = self.governor.settings
+        if self.pose_worker:
+            self.pose_worker.inference_size = settings["inference_size"]
+        if self.cam:
+            self.cam.set_capture_size(*settings["capture_size"])
+        if self.level:
+            self.level.set_quality(settings)
+
+    def end_level(self):
+        """Cierra el nivel actual y vuelve al menu"""
+        if isinstance(self.level, LatencyCalibration):
+            if self.level.result is not None:
+                self.latency_offset = self.level.result
+        elif isinstance(self.level, MultiplayerLevel):
+            print("Partida terminada")
+            for lane in self.level.lanes:
+                print(f"  J{lane.player_index + 1} - Score: {lane.score}, Max Combo: {lane.max_combo}")
+        else:
+            # Como en ReplayLevel.run: el score grabado incluye los cruces pendientes
+            self.level.flush_judgements()
+            print(f"Partida terminada - Score: {self.level.score}, Max Combo: {self.level.max_combo}")
+            self.level.save_recording()
+        if getattr(self.level, "motion_gate", None):
+            print(self.level.motion_gate.summary())
+        self.state = "MENU"
+        self.level = None
+        self.menu.invalidate()
+
     def cleanup(self):
         """Limpieza de recursos al cerrar"""
         print("\nLiberando recursos...")
@@ -709,9 +3230,18 @@ class GameManager:
             pygame.mixer.music.stop()
             print("Musica detenida")
         
-        if hasattr(self, 'cam'):
+        if getattr(self, 'pose_worker', None):
+            self.pose_worker.stop()
+        
+        if hasattr(self, 'profiler'):
+            self.profiler.close()
+        
+        if getattr(self, 'cam', None):
             self.cam.release()
         
+        if getattr(self, 'pipeline', None):
+            self.pipeline.close()
+        
         pygame.quit()
         print("Limpieza completada. Hasta pronto!")
         sys.exit(0)
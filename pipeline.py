@@ -0,0 +1,453 @@
+"""
+Pipeline multiproceso de NEURO RHYTHM: captura, inferencia y render en
+procesos separados, cada uno con su propio GIL.
+
+Los frames viajan por un buffer circular en memoria compartida y los
+keypoints por un slot de tamano fijo; ninguno se serializa con pickle. Las
+lecturas no toman locks: cada slot lleva un contador de secuencia (seqlock)
+que el escritor deja impar mientras escribe, y el lector reintenta si el
+contador cambio durante la copia.
+
+Se activa con MULTIPROCESS_PIPELINE = True en main.py. El proceso principal
+(pygame) es el de render y usa SharedCamera y SharedPoseWorker, que exponen
+la misma interfaz que CameraEngine y PoseWorker.
+"""
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import time
+
+import numpy as np
+import pygame
+
+FRAME_META_DTYPE = np.dtype([("seq", np.uint64), ("time", np.float64), ("index", np.int64)])
+CONTROL_DTYPE = np.dtype([
+    ("latest", np.int64),           # Slot del ultimo frame completo (-1 = ninguno)
+    ("frames", np.int64),           # Frames capturados
+    ("read_failures", np.int64),
+    ("requested", np.int64),        # Pedidos de inferencia del render (ver submit)
+    ("inference_size", np.int32),   # Ajustes del gobernador de calidad (0 = sin cambios)
+    ("capture_width", np.int32),
+    ("capture_height", np.int32),
+    ("capture_state", np.int8),     # 0 iniciando, 1 listo, -1 error
+    ("inference_state", np.int8)
+])
+STARTUP_TIMEOUT = 120.0             # Segundos maximos para cargar modelo y camara
+SHUTDOWN_TIMEOUT = 2.0
+
+def keypoint_slot_dtype(max_people):
+    return np.dtype([
+        ("seq", np.uint64),
+        ("result_id", np.int64),
+        ("count", np.int32),
+        ("time", np.float64),
+        ("latency", np.float64),
+        ("dropped", np.int64),
+        ("people", np.float32, (max_people, 17, 3)),
+        ("boxes", np.float32, (max_people, 4))
+    ])
+
+#MEMORIA COMPARTIDA
+class SharedBlock:
+    """Arreglo de NumPy sobre un bloque de memoria compartida (creado o adjuntado por nombre)"""
+    def __init__(self, shape, dtype, name=None):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.owner = name is None
+        if self.owner:
+            size = max(1, int(np.prod(self.shape)) * self.dtype.itemsize)
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            np.ndarray(self.shm.size, np.uint8, self.shm.buf)[:] = 0
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.array = np.ndarray(self.shape, self.dtype, buffer=self.shm.buf)
+
+    def spec(self):
+        """Lo necesario para adjuntarlo desde otro proceso"""
+        return self.shape, self.dtype, self.shm.name
+
+    @classmethod
+    def attach(cls, spec):
+        shape, dtype, name = spec
+        return cls(shape, dtype, name)
+
+    def close(self):
+        # Las vistas de NumPy deben soltarse antes de cerrar el bloque
+        self.array = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+class SharedFrameRing:
+    """Buffer circular de frames RGB: un escritor (captura), varios lectores"""
+    def __init__(self, frames, meta, control):
+        self.frames = frames
+        self.meta = meta
+        self.control = control
+        self.slots = frames.shape[0]
+        self.write_slot = 0
+
+    @classmethod
+    def create(cls, slots, shape):
+        meta = SharedBlock((slots,), FRAME_META_DTYPE)
+        control = SharedBlock((1,), CONTROL_DTYPE)
+        control.array["latest"] = -1
+        return cls(SharedBlock((slots,) + tuple(shape), np.uint8), meta, control)
+
+    @classmethod
+    def attach(cls, specs):
+        return cls(*(SharedBlock.attach(spec) for spec in specs))
+
+    def specs(self):
+        return self.frames.spec(), self.meta.spec(), self.control.spec()
+
+    @property
+    def state(self):
+        return self.control.array[0]
+
+    def begin_write(self):
+        """Slot a escribir (nunca el ultimo publicado) y su arreglo de destino"""
+        slot = self.write_slot
+        self.meta.array["seq"][slot] += 1     # Impar: escritura en curso
+        return slot, self.frames.array[slot]
+
+    def end_write(self, slot, timestamp):
+        meta = self.meta.array
+        meta["time"][slot] = timestamp
+        meta["index"][slot] = self.state["frames"]
+        meta["seq"][slot] += 1                # Par: slot consistente
+        self.state["latest"] = slot
+        self.state["frames"] += 1
+        self.write_slot = (slot + 1) % self.slots
+
+    def latest_index(self):
+        """Indice del ultimo frame publicado (-1 si aun no hay)"""
+        slot = int(self.state["latest"])
+        return -1 if slot < 0 else int(self.meta.array["index"][slot])
+
+    def read_latest(self, out, retries=3):
+        """Copia el ultimo frame en `out`; devuelve (indice, timestamp) o None"""
+        meta = self.meta.array
+        for _ in range(retries):
+            slot = int(self.state["latest"])
+            if slot < 0:
+                return None
+            seq = int(meta["seq"][slot])
+            if seq % 2:
+                continue
+            np.copyto(out, self.frames.array[slot])
+            index, timestamp = int(meta["index"][slot]), float(meta["time"][slot])
+            if int(meta["seq"][slot]) == seq:
+                return index, timestamp
+        return None
+
+    def close(self):
+        for block in (self.frames, self.meta, self.control):
+            block.close()
+
+class KeypointSlot:
+    """Ultimo resultado de pose (todas las personas) con escritura unica y lectura sin locks"""
+    def __init__(self, block):
+        self.block = block
+        self.max_people = block.dtype["people"].shape[0]
+
+    @classmethod
+    def create(cls, max_people):
+        return cls(SharedBlock((1,), keypoint_slot_dtype(max_people)))
+
+    @classmethod
+    def attach(cls, spec):
+        return cls(SharedBlock.attach(spec))
+
+    def spec(self):
+        return self.block.spec()
+
+    @property
+    def record(self):
+        return self.block.array[0]
+
+    def write(self, people, boxes, timestamp, latency, dropped):
+        record = self.record
+        count = min(len(people), self.max_people)
+        record["seq"] += 1
+        record["people"][:count] = people[:count]
+        record["boxes"][:count] = boxes[:count]
+        record["count"] = count
+        record["time"] = timestamp
+        record["latency"] = latency
+        record["dropped"] = dropped
+        record["result_id"] += 1
+        record["seq"] += 1
+
+    def read(self):
+        """Devuelve (keypoints (P, 17, 3), cajas (P, 4), timestamp, result_id)"""
+        record = self.record
+        for _ in range(1000):
+            seq = int(record["seq"])
+            if seq % 2:
+                time.sleep(0)
+                continue
+            count = int(record["count"])
+            people = record["people"][:count].copy()
+            boxes = record["boxes"][:count].copy()
+            timestamp, result_id = float(record["time"]), int(record["result_id"])
+            if int(record["seq"]) == seq:
+                return people, boxes, timestamp, result_id
+        # Escritor detenido a mitad de una escritura (proceso caido)
+        return np.zeros((0, 17, 3), dtype=np.float32), np.zeros((0, 4), dtype=np.float32), 0.0, 0
+
+    def close(self):
+        self.block.close()
+
+#PROCESOS
+def capture_process(ring_specs, camera_id, stop):
+    """Lee la camara, espeja y convierte a RGB directamente sobre el buffer circular"""
+    import cv2
+    ring = SharedFrameRing.attach(ring_specs)
+    height, width = ring.frames.shape[1:3]
+    cap = None
+    try:
+        cap = cv2.VideoCapture(camera_id)
+        if not cap.isOpened():
+            print(f"[captura] No se pudo abrir la camara {camera_id}")
+            ring.state["capture_state"] = -1
+            return
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        ring.state["capture_state"] = 1
+
+        raw = None
+        scaled = np.empty((height, width, 3), dtype=np.uint8)
+        mirror = np.empty((height, width, 3), dtype=np.uint8)
+        capture_size = (width, height)
+        while not stop.is_set():
+            requested_size = (int(ring.state["capture_width"]), int(ring.state["capture_height"]))
+            if requested_size[0] > 0 and requested_size != capture_size:
+                cap.set(cv2.CAP_PROP_FRAME_WIDTH, requested_size[0])
+                cap.set(cv2.CAP_PROP_FRAME_HEIGHT, requested_size[1])
+                capture_size = requested_size
+                raw = None
+            ret, raw = cap.read(raw)
+            timestamp = time.monotonic()
+            if not ret:
+                ring.state["read_failures"] += 1
+                time.sleep(0.01)
+                continue
+            frame = raw
+            if raw.shape[:2] != (height, width):
+                # Buffer propio: `raw` conserva la forma de la captura y cap.read lo reutiliza
+                frame = cv2.resize(raw, (width, height), scaled)
+            cv2.flip(frame, 1, mirror)
+            slot, target = ring.begin_write()
+            cv2.cvtColor(mirror, cv2.COLOR_BGR2RGB, target)
+            ring.end_write(slot, timestamp)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if cap is not None:
+            cap.release()
+        ring = None
+
+def inference_process(ring_specs, slot_spec, backend, inference_size, roi, wake, stop):
+    """Carga el modelo y procesa el frame mas reciente cada vez que el render lo pide"""
+    import main
+    ring = SharedFrameRing.attach(ring_specs)
+    slot = KeypointSlot.attach(slot_spec)
+    try:
+        try:
+            model = main.PoseBackend(backend)
+            model.warmup(inference_size=inference_size)
+        except Exception as e:
+            print(f"[inferencia] Error al cargar el modelo: {e}")
+            ring.state["inference_state"] = -1
+            return
+        ring.state["inference_state"] = 1
+
+        roi_tracker = main.RoiTracker() if roi else None
+        frame = np.empty(ring.frames.shape[1:], dtype=np.uint8)
+        handled = 0
+        dropped = 0
+        while not stop.is_set():
+            if not wake.wait(0.1):
+                continue
+            wake.clear()
+            requested = int(ring.state["requested"])
+            if requested == handled:
+                continue
+            # Pedidos que llegaron mientras se procesaba el anterior: se descartan
+            dropped += max(0, requested - handled - 1)
+            handled = requested
+            entry = ring.read_latest(frame)
+            if entry is None:
+                continue
+            inference_size = int(ring.state["inference_size"]) or inference_size
+            start = time.monotonic()
+            people, boxes = main.run_pose_inference_all(model, frame, inference_size, roi_tracker)
+            slot.write(people, boxes, entry[1], time.monotonic() - start, dropped)
+        if roi_tracker:
+            print(f"[inferencia] {roi_tracker.summary()}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ring = None
+        slot = None
+
+#INTERFAZ DEL RENDER
+class SharedCamera:
+    """Misma interfaz que CameraEngine, leyendo del buffer circular compartido"""
+    def __init__(self, ring):
+        self.ring = ring
+        height, width = ring.frames.shape[1:3]
+        self.rgb_buffer = np.empty((height, width, 3), dtype=np.uint8)
+        # La superficie comparte memoria con rgb_buffer (sin copia)
+        self.last_surface = pygame.image.frombuffer(self.rgb_buffer, (width, height), "RGB")
+        self.last_frame_rgb = None
+        self.last_frame_seq = -1
+        self.last_frame_time = 0.0
+        self.dropped_frames = 0
+
+    def get_frame(self):
+        index = self.ring.latest_index()
+        if index < 0:
+            return None
+        if index == self.last_frame_seq:
+            return self.last_surface
+        entry = self.ring.read_latest(self.rgb_buffer)
+        if entry is None:
+            return self.last_surface if self.last_frame_rgb is not None else None
+        index, timestamp = entry
+        if self.last_frame_seq >= 0:
+            self.dropped_frames += max(0, index - self.last_frame_seq - 1)
+        self.last_frame_seq = index
+        self.last_frame_time = timestamp
+        self.last_frame_rgb = self.rgb_buffer
+        return self.last_surface
+
+    def set_capture_size(self, width, height):
+        """La aplica el proceso de captura; los frames se siguen escalando al tamano del buffer"""
+        self.ring.state["capture_width"] = width
+        self.ring.state["capture_height"] = height
+
+    def get_stats(self):
+        return {
+            "captured": int(self.ring.state["frames"]),
+            "dropped": self.dropped_frames,
+            "read_failures": int(self.ring.state["read_failures"])
+        }
+
+    def release(self):
+        # Los procesos y la memoria compartida los cierra SharedPipeline.close
+        stats = self.get_stats()
+        print(f"Camara liberada (capturados: {stats['captured']}, "
+              f"descartados: {stats['dropped']}, fallos: {stats['read_failures']})")
+
+class SharedPoseWorker:
+    """Misma interfaz que PoseWorker; la inferencia corre en su propio proceso"""
+    def __init__(self, ring, slot, wake):
+        self.ring = ring
+        self.slot = slot
+        self.wake = wake
+        self.last_submitted_time = None
+
+    def start(self):
+        pass
+
+    def submit(self, frame_rgb, timestamp=None):
+        """Pide una inferencia: el proceso lee el frame mas reciente del buffer, no este arreglo"""
+        if timestamp is not None and timestamp == self.last_submitted_time:
+            return
+        self.last_submitted_time = timestamp
+        self.ring.state["requested"] += 1
+        self.wake.set()
+
+    def get_latest(self):
+        """Devuelve (keypoints, timestamp) del ultimo resultado publicado"""
+        people, _, timestamp, _ = self.slot.read()
+        return (people[0] if len(people) > 0 else []), timestamp
+
+    def get_latest_people(self):
+        """Devuelve (keypoints (P, 17, 3), cajas (P, 4), timestamp) de todas las personas"""
+        people, boxes, timestamp, _ = self.slot.read()
+        return people, boxes, timestamp
+
+    @property
+    def inference_size(self):
+        return int(self.ring.state["inference_size"])
+
+    @inference_size.setter
+    def inference_size(self, size):
+        # Con None (resolucion completa) se mantiene el tamano inicial del proceso
+        self.ring.state["inference_size"] = size or 0
+
+    @property
+    def result_id(self):
+        return int(self.slot.record["result_id"])
+
+    @property
+    def dropped_frames(self):
+        return int(self.slot.record["dropped"])
+
+    @property
+    def last_latency(self):
+        return float(self.slot.record["latency"])
+
+    def stop(self):
+        print(f"Inferencia multiproceso detenida (frames descartados: {self.dropped_frames})")
+
+class SharedPipeline:
+    """Crea la memoria compartida y los procesos de captura e inferencia"""
+    def __init__(self, frame_shape, slots, max_people, camera_id, backend, inference_size, roi):
+        self.context = mp.get_context("spawn")
+        self.ring = SharedFrameRing.create(slots, frame_shape)
+        self.slot = KeypointSlot.create(max_people)
+        self.stop_event = self.context.Event()
+        self.wake = self.context.Event()
+        self.processes = [
+            self.context.Process(target=capture_process, name="Captura", daemon=True,
+                                 args=(self.ring.specs(), camera_id, self.stop_event)),
+            self.context.Process(target=inference_process, name="Inferencia", daemon=True,
+                                 args=(self.ring.specs(), self.slot.spec(), backend, inference_size,
+                                       roi, self.wake, self.stop_event))
+        ]
+        self.camera = SharedCamera(self.ring)
+        self.pose_worker = SharedPoseWorker(self.ring, self.slot, self.wake)
+        self.closed = False
+
+    def start(self, timeout=STARTUP_TIMEOUT):
+        """Lanza los procesos y espera a que la camara y el modelo esten listos"""
+        for process in self.processes:
+            process.start()
+        deadline = time.monotonic() + timeout
+        while True:
+            states = int(self.ring.state["capture_state"]), int(self.ring.state["inference_state"])
+            if -1 in states:
+                raise RuntimeError("Fallo la inicializacion de " +
+                                   ("la camara" if states[0] == -1 else "el modelo"))
+            if states == (1, 1):
+                break
+            if not all(process.is_alive() for process in self.processes):
+                raise RuntimeError("Un proceso del pipeline termino inesperadamente")
+            if time.monotonic() > deadline:
+                raise RuntimeError("Tiempo de espera agotado al iniciar el pipeline")
+            time.sleep(0.05)
+        print(f"Pipeline multiproceso listo (PIDs: {', '.join(str(p.pid) for p in self.processes)})")
+        return self
+
+    def close(self):
+        """Detiene los procesos y libera la memoria compartida"""
+        if self.closed:
+            return
+        self.closed = True
+        self.stop_event.set()
+        self.wake.set()
+        for process in self.processes:
+            if process.pid is None:
+                continue
+            process.join(timeout=SHUTDOWN_TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+                process.join(timeout=SHUTDOWN_TIMEOUT)
+        # Soltar las vistas del render antes de cerrar los bloques
+        self.camera.last_frame_rgb = None
+        self.ring.close()
+        self.slot.close()
+        print("Pipeline multiproceso detenido")
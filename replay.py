@@ -0,0 +1,125 @@
+"""
+Replay de sesiones grabadas de NEURO RHYTHM (RECORD_SESSIONS = True en main.py).
+
+Recalcula el puntaje de cada sesion a partir de los keypoints grabados, sin
+camara ni YOLO y mas rapido que en tiempo real. Sirve para resolver disputas
+de puntaje y para ajustar los umbrales del registro de poses en lote.
+
+Uso:
+    python replay.py sessions/*.npz
+    python replay.py sessions/session_20251120_181500.npz --draw
+    python replay.py sessions/*.npz --sweep y_dist_vert=0.2:0.6:0.05
+"""
+import os
+import argparse
+import glob
+import sys
+import time
+
+def parse_sweep(spec):
+    """'nombre=inicio:fin:paso' -> (nombre, valores)"""
+    name, values = spec.split("=")
+    start, stop, step = (float(v) for v in values.split(":"))
+    count = int(round((stop - start) / step)) + 1
+    return name, [start + i * step for i in range(count)]
+
+def run_sweep(paths, spec):
+    """Tasa de activacion de cada pose por valor de umbral, con el clasificador en lote"""
+    import numpy as np
+    from main import classify_poses_batch, load_session, get_pose_registry
+
+    pose_registry = get_pose_registry()
+    name, values = parse_sweep(spec)
+    if name not in pose_registry.thresholds:
+        print(f"Umbral desconocido: {name} (opciones: {', '.join(pose_registry.thresholds)})")
+        sys.exit(1)
+
+    keypoints, conf = [], []
+    for path in paths:
+        frames, _, _ = load_session(path)
+        frames = frames[frames["has_pose"]]
+        keypoints.append(frames["keypoints"])
+        conf.append(frames["conf"])
+    keypoints = np.concatenate(keypoints)
+    conf = np.concatenate(conf)
+
+    start = time.perf_counter()
+    print(f"{name:>12}" + "".join(f"{'pose ' + str(i):>9}" for i in range(pose_registry.count)))
+    for value in values:
+        rates = classify_poses_batch(keypoints, conf, {name: value}).mean(axis=0)
+        print(f"{value:>12.2f}" + "".join(f"{rate:>9.3f}" for rate in rates))
+    elapsed = time.perf_counter() - start
+    print(f"\n{len(keypoints)} frames x {len(values)} valores en {elapsed:.2f} s")
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Replay de sesiones grabadas")
+    parser.add_argument("sessions", nargs="+", help="Archivos .npz (se aceptan comodines)")
+    parser.add_argument("--draw", action="store_true", help="Mostrar la partida en una ventana")
+    parser.add_argument("--latency-offset", type=float, default=None,
+                        help="Offset de latencia en segundos (por defecto el grabado)")
+    parser.add_argument("--sweep", help="Barrido de un umbral de pose: nombre=inicio:fin:paso")
+    parser.add_argument("--verify", action="store_true",
+                        help="Terminar con error si algun score no coincide con el grabado")
+    args = parser.parse_args()
+
+    if not args.draw:
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+    import pygame
+    from main import ReplayLevel, WINDOW_WIDTH, WINDOW_HEIGHT
+
+    paths = []
+    for pattern in args.sessions:
+        paths.extend(sorted(glob.glob(pattern)) or [pattern])
+
+    if args.sweep:
+        run_sweep(paths, args.sweep)
+        return
+
+    pygame.init()
+    if args.draw:
+        screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
+    else:
+        screen = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT))
+
+    total_frames = 0
+    total_session_time = 0.0
+    mismatches = 0
+    start = time.perf_counter()
+    for path in paths:
+        try:
+            level = ReplayLevel(screen, path, draw=args.draw, latency_offset=args.latency_offset)
+        except Exception as e:
+            print(f"{path}: error al cargar ({e})")
+            continue
+        result = level.run()
+
+        frames = level.frames
+        total_frames += len(frames)
+        if len(frames) > 1:
+            total_session_time += float(frames["clock"][-1] - frames["clock"][0])
+        # Con otros umbrales u otro offset el score puede cambiar: se informa, no se corta el lote
+        recorded = level.metadata.get("score")
+        diff = ""
+        if recorded is not None:
+            diff = f"  (grabado: {recorded})"
+            if result["score"] != recorded:
+                mismatches += 1
+                diff = f"  (grabado: {recorded}, DISTINTO)"
+        print(f"{path}: score {result['score']}, aciertos {result['hits']}, "
+              f"fallos {result['misses']}, max combo {result['max_combo']}{diff}")
+
+    elapsed = time.perf_counter() - start
+    pygame.quit()
+    if total_frames == 0:
+        sys.exit(1)
+    speedup = total_session_time / elapsed if elapsed > 0 else 0.0
+    print(f"\n{len(paths)} sesiones, {total_frames} frames en {elapsed:.2f} s "
+          f"({speedup:.0f}x tiempo real)")
+    if mismatches:
+        print(f"{mismatches} sesiones con score distinto al grabado")
+        if args.verify:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main_cli()